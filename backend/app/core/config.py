@@ -1,8 +1,65 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     app_name: str = "Hirere"
     database_url: str = "postgresql://postgres:postgres@db:5432/hirere"
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    # 0 leaves Postgres' statement_timeout unset
+    db_statement_timeout_ms: int = 0
+    # Serve the hot endpoints through an asyncpg engine
+    async_db_enabled: bool = False
     face_match_threshold: float = 0.4
+    face_detector_backend: str = "mediapipe"
+    face_model_name: str = "VGG-Face"
+    # Longest side of the image the detector sees (0 detects at full size)
+    face_detector_input_size: int = 640
+    # JPEG frames are decoded at the largest 1/2, 1/4 or 1/8 reduction that
+    # keeps their longest side at least this long (0 always decodes fully)
+    frame_decode_min_side: int = 960
+    preload_models: bool = True
+    persist_frame_images: bool = True
+    frame_storage_dir: str = "/app/uploads"
+    # Days to keep frame images per event type; other event types keep
+    # their images indefinitely
+    frame_retention_days: Dict[str, int] = {"face_match": 30}
+    frame_sweep_interval_seconds: float = 3600.0
+    # Embedding batches are bounded by the number of concurrent callers,
+    # i.e. inference_workers with the thread backend; the process backend
+    # does not batch
+    embedding_batch_max_size: int = 8
+    embedding_batch_max_wait_ms: float = 5.0
+    # Mean grey-level difference below which a frame reuses the session's
+    # last verdict (0 disables gating), and the longest run of reused frames
+    frame_gate_threshold: float = 3.0
+    frame_gate_max_skips: int = 5
+    baseline_cache_size: int = 10000
+    baseline_cache_ttl_seconds: float = 300.0
+    # Distance between normalized embeddings below which two users' faces
+    # are flagged as the same person
+    duplicate_face_threshold: float = 0.4
+    face_index_snapshot_path: Optional[str] = None
+    answer_key_ttl_seconds: float = 300.0
+    exam_snapshot_ttl_seconds: float = 300.0
+    exam_snapshot_gzip: bool = True
+    question_import_chunk_size: int = 1000
+    principal_cache_ttl_seconds: float = 60.0
+    principal_cache_size: int = 100000
+    password_hash_workers: int = 4
+    # inline, thread or process
+    inference_backend: str = "thread"
+    inference_workers: int = 4
+    inference_max_pending: int = 64
+    # Frames accepted by /proctor/frames that may wait for analysis, and the
+    # number of consumers feeding them to the inference executor
+    frame_ingest_max_queued: int = 256
+    frame_ingest_workers: int = 8
+    # How often the rollups of recently active exams are rebuilt from the raw
+    # logs (0 disables)
+    rollup_reconcile_interval_seconds: float = 3600.0
 
 settings = Settings()
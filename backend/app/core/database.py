@@ -1,19 +1,111 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from fastapi.concurrency import run_in_threadpool
 from .config import settings
 
 Base = declarative_base()
 
-engine = create_engine(settings.database_url)
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """
+    Pool and timeout options for create_engine / create_async_engine,
+    taken from Settings. SQLite keeps SQLAlchemy's defaults.
+    """
+    if url.startswith("sqlite"):
+        return {}
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if settings.db_statement_timeout_ms and url.startswith("postgresql"):
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"}
+    return options
+
+def async_database_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
-def init_db():
-    # import all modules here that might define models so that
-    # they will be registered properly on the metadata.  Otherwise
-    # you will have to import them first before calling init_db()
-    from app.models import user, exam, proctor
-    Base.metadata.create_all(bind=engine)
+# Optional asyncpg engine for the hot endpoints. When it is disabled they
+# run the same code on the sync engine through the threadpool.
+async_engine = None
+AsyncSessionLocal = None
+if settings.async_db_enabled:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _async_url = async_database_url(settings.database_url)
+    async_engine = create_async_engine(_async_url, **engine_options(_async_url, is_async=True))
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def dialect_insert(db, model):
+    """
+    Returns an INSERT for model from the session's dialect, so callers can
+    chain dialect extensions such as on_conflict_do_nothing().
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"No upsert support for the {dialect} dialect")
+    return insert(model)
+
+class LeaderLock:
+    """
+    Elects one worker to run a periodic background job. On Postgres the
+    leader holds a session-level advisory lock on a dedicated connection
+    for as long as it runs, so another worker takes over once it goes away.
+    Other databases are served by a single process, which always leads.
+    """
+
+    def __init__(self, key: int, name: str):
+        self.key = key
+        self.name = name
+        self._connection = None
+
+    def acquire(self, engine) -> bool:
+        if engine.dialect.name != "postgresql":
+            return True
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1"))
+                self._connection.commit()
+                return True
+            except Exception:
+                # The connection, and with it the lock, is gone
+                self.release()
+        connection = engine.connect()
+        try:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+            connection.commit()
+        except Exception as e:
+            print(f"Error acquiring the {self.name} lock: {e}")
+            acquired = False
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
 
 def get_db():
     db = SessionLocal()
@@ -21,3 +113,42 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """
+    Yields an AsyncSession when async_db_enabled is set, otherwise None.
+    Pass the result to run_db together with the request's sync session.
+    """
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    async with AsyncSessionLocal() as session:
+        yield session
+
+async def run_db(db, async_db, fn, *args):
+    """
+    Runs fn(session, *args), a plain synchronous ORM function, without
+    blocking the event loop: on the AsyncSession's connection via run_sync
+    when the async engine is enabled, otherwise on the sync session in
+    the threadpool.
+    """
+    if async_db is not None:
+        return await async_db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+async def run_in_new_session(fn, *args):
+    """
+    Like run_db for work outside a request, such as background tasks:
+    opens a fresh session and closes it afterwards.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            return await session.run_sync(fn, *args)
+
+    def run():
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+    return await run_in_threadpool(run)
@@ -1,8 +1,16 @@
+import threading
+from sqlalchemy import Integer, exists, literal, select
 from sqlalchemy.orm import Session
-from app.models.exam import Exam, Question
+from app.models.exam import Exam, Question, Submission
+from app.models.assignment import ExamAssignment
 from app.models.user import User
+from app.core.database import dialect_insert
 from app.core.security import hash_password
 
+# Id of the demo exam once it has been looked up or created in this process
+_demo_exam_id = None
+_demo_exam_lock = threading.Lock()
+
 def get_or_create_demo_exam(db: Session) -> Exam:
     """
     Retrieves the demo exam from the database or creates it if it does not exist.
@@ -53,3 +61,39 @@ def get_or_create_demo_exam(db: Session) -> Exam:
 
     db.commit()
     return demo_exam
+
+def get_demo_exam_id(db: Session) -> int:
+    """
+    Returns the demo exam id, hitting the database only the first time.
+    Concurrent first calls are serialized so the exam is created once.
+    """
+    global _demo_exam_id
+    if _demo_exam_id is None:
+        with _demo_exam_lock:
+            if _demo_exam_id is None:
+                _demo_exam_id = get_or_create_demo_exam(db).id
+    return _demo_exam_id
+
+def forget_demo_exam(exam_id: int):
+    """
+    Drops the cached id if it refers to exam_id, e.g. after it is deleted.
+    """
+    global _demo_exam_id
+    if _demo_exam_id == exam_id:
+        _demo_exam_id = None
+
+def assign_demo_exam(db: Session, user_id: int):
+    """
+    Assigns the demo exam to the user unless they already submitted it,
+    as one INSERT ... SELECT ... ON CONFLICT DO NOTHING statement.
+    """
+    exam_id = get_demo_exam_id(db)
+    user_id_param = literal(user_id, Integer)
+    exam_id_param = literal(exam_id, Integer)
+    not_submitted = ~exists().where(Submission.user_id == user_id_param, Submission.exam_id == exam_id_param)
+    stmt = dialect_insert(db, ExamAssignment).from_select(
+        ["user_id", "exam_id"],
+        select(user_id_param, exam_id_param).where(not_submitted)
+    ).on_conflict_do_nothing(index_elements=["user_id", "exam_id"])
+    db.execute(stmt)
+    db.commit()
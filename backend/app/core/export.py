@@ -0,0 +1,83 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, List
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_ROWS = 1000
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+def stream_rows(bind, statement, names: List[str], format: str) -> Iterator[bytes]:
+    """
+    Executes statement on its own session and yields encoded chunks of
+    EXPORT_CHUNK_ROWS rows. yield_per keeps a server-side cursor open, so
+    memory stays flat however many rows the export covers.
+    """
+    with Session(bind=bind) as session:
+        result = session.execute(statement.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if format == "csv" else None
+        if writer:
+            writer.writerow(names)
+        for partition in result.partitions():
+            for row in partition:
+                if writer:
+                    writer.writerow([_csv_value(value) for value in row])
+                else:
+                    buffer.write(json.dumps(dict(zip(names, row)), default=_json_default))
+                    buffer.write("\n")
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_response(db: Session, query, columns: list, format: str, compress: bool, filename: str) -> StreamingResponse:
+    """
+    Streams the given columns of query as NDJSON or CSV, optionally gzipped.
+    The rows are read after the request's own session is released, on a
+    fresh session bound to the same engine.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+
+    statement = query.with_entities(*columns).statement
+    names = [column.key for column in columns]
+    chunks = stream_rows(db.get_bind(), statement, names, format)
+    media_type = EXPORT_MEDIA_TYPES[format]
+    filename = f"{filename}.{format}"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
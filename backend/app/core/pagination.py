@@ -0,0 +1,57 @@
+import base64
+import datetime
+from typing import List, Optional
+from fastapi import HTTPException, Response
+from sqlalchemy import literal, tuple_
+
+# Page sizes accepted by the paginated list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Response header carrying the cursor of the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(timestamp: datetime.datetime, id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(timestamp), int(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def select_columns(model, fields: Optional[str], allowed: List[str]) -> list:
+    """
+    Maps a comma-separated ?fields= value onto model columns, so list
+    endpoints only load what the caller asked for. Defaults to all allowed.
+    """
+    names = [name.strip() for name in fields.split(",") if name.strip()] if fields else allowed
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return [getattr(model, name) for name in names]
+
+def keyset_page(query, columns: list, time_column, id_column, cursor: Optional[str], limit: int, response: Response) -> List[dict]:
+    """
+    Returns one page of rows, newest first, as dicts of the given columns.
+
+    Rows are ordered by (time_column, id_column) descending and the page
+    starts strictly after the cursor, so each page is an index range scan
+    whatever its depth. The cursor for the next page is set in the
+    X-Next-Cursor response header.
+    """
+    query = query.with_entities(*columns, time_column.label("_cursor_time"), id_column.label("_cursor_id"))
+    if cursor:
+        timestamp, id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(time_column, id_column) < tuple_(literal(timestamp, time_column.type), literal(id, id_column.type))
+        )
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1]._cursor_time, rows[-1]._cursor_id)
+
+    names = [column.key for column in columns]
+    return [{name: row[i] for i, name in enumerate(names)} for row in rows]
@@ -1,9 +1,15 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
 
@@ -14,33 +20,141 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is deliberately slow; run it on its own small pool so a login wave
+# neither starves the request threadpool nor oversubscribes the CPU
+password_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt")
+
 def verify_password(plain, hashed):
     return pwd_context.verify(plain, hashed)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain, hashed) -> bool:
+    return await asyncio.wrap_future(password_executor.submit(verify_password, plain, hashed))
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.wrap_future(password_executor.submit(hash_password, password))
+
+class Principal:
+    """
+    The authenticated caller as described by the access token's claims.
+    Carries just what authorization needs, so hot endpoints can use it
+    instead of loading the User row.
+    """
+
+    def __init__(self, id: int, email: str, role: str):
+        self.id = id
+        self.email = email
+        self.role = role
+
+# Decoded and checked access tokens, so repeated requests with the same
+# token skip signature verification and the database:
+# token -> (principal, cached_until)
+_principal_cache = OrderedDict()
+_principal_lock = threading.Lock()
+
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def create_user_access_token(user: User):
+    """
+    Issues an access token carrying the user's id, role and token version
+    as claims, so requests can be authorized without loading the user.
+    """
+    return create_access_token({"sub": user.email, "uid": user.id, "role": user.role, "ver": user.token_version})
+
+def revoke_user_tokens(db: Session, user_id: int):
+    """
+    Rejects every token issued to the user up to now by bumping their
+    stored token version. Call this after changing a user's role or
+    disabling them; their next login gets a token with the new claims.
+    Other workers stop accepting the tokens once their cached principals
+    expire, within principal_cache_ttl_seconds.
+    """
+    db.query(User).filter(User.id == user_id).update({User.token_version: User.token_version + 1})
+    db.commit()
+    with _principal_lock:
+        for token in [t for t, entry in _principal_cache.items() if entry[0].id == user_id]:
+            del _principal_cache[token]
+
+def get_user_from_token(token: str, db: Session):
+    """
+    Decodes an access token and returns its user, or None if the token is
+    invalid or the user no longer exists.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+    user = db.query(User).filter(User.email == email).first()
+    if user is None or payload.get("ver", 0) < user.token_version:
+        return None
+    return user
+
+def get_principal_from_token(token: str, db: Session):
+    """
+    Returns the Principal for an access token, or None if it is invalid,
+    expired or revoked. Tokens carrying a uid claim are checked against
+    the user's current role and token version with one primary-key lookup,
+    then cached for principal_cache_ttl_seconds; older tokens without it
+    fall back to a lookup by email.
+    """
+    now = time.time()
+    with _principal_lock:
+        entry = _principal_cache.get(token)
+        if entry is not None:
+            principal, cached_until = entry
+            if cached_until > now:
+                _principal_cache.move_to_end(token)
+                return principal
+            del _principal_cache[token]
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email = payload.get("sub")
+    user_id = payload.get("uid")
+    if email is None:
+        return None
+
+    if user_id is None:
+        user = db.query(User.id, User.email, User.role).filter(User.email == email).first()
+        return Principal(user.id, user.email, user.role) if user else None
+
+    user = db.query(User.role, User.token_version).filter(User.id == user_id).first()
+    if user is None or payload.get("ver", 0) < user.token_version:
+        return None
+    principal = Principal(user_id, email, user.role)
+    with _principal_lock:
+        _principal_cache[token] = (principal, min(now + settings.principal_cache_ttl_seconds, payload["exp"]))
+        while len(_principal_cache) > settings.principal_cache_size:
+            _principal_cache.popitem(last=False)
+    return principal
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+    user = get_user_from_token(token, db)
+    if user is None:
+        raise _credentials_exception()
+    return user
+
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    principal = get_principal_from_token(token, db)
+    if principal is None:
+        raise _credentials_exception()
+    return principal
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-
-        user = db.query(User).filter(User.email == email).first()
-        if user is None:
-            raise credentials_exception
-        return user
-    except JWTError:
-        raise credentials_exception
@@ -1,9 +1,15 @@
 from fastapi import FastAPI
 from .routers import health, users, auth, exams, proctor, submissions, questions
-from app.core.database import init_db, engine
+from app.core.database import engine, SessionLocal
+from app.migrations import LATEST_VERSION, schema_version
+from app.core.config import settings
+from app.services.inference import inference_executor
+from app.services.face_index import face_index
+from app.services.rollups import rollup_reconciler
+from app.services.frame_store import frame_sweeper
 from app.models.assignment import ExamAssignment
-from sqlalchemy import inspect, text
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.pagination import NEXT_CURSOR_HEADER
 
 
 app = FastAPI(title="Hirere API")
@@ -15,22 +21,40 @@ app.include_router(proctor.router, prefix="/api/proctor", tags=["proctor"])
 app.include_router(submissions.router, prefix="/api/submissions", tags=["submissions"])
 app.include_router(questions.router, prefix="/api/questions", tags=["questions"])
 
-def check_and_add_role_column():
-    inspector = inspect(engine)
-    columns = [col['name'] for col in inspector.get_columns('users')]
-    if 'role' not in columns:
-        with engine.connect() as connection:
-            connection.execute(text('ALTER TABLE users ADD COLUMN role VARCHAR NOT NULL DEFAULT \'user\''))
-            connection.commit()
+def check_schema_version():
+    version = schema_version(engine)
+    if version < LATEST_VERSION:
+        print(f"Database schema is at version {version}, expected {LATEST_VERSION}; run `python -m app.migrations`")
 
 @app.on_event("startup")
 def startup_event():
-    init_db()
-    check_and_add_role_column()
+    # Schema changes are applied by `python -m app.migrations` before the
+    # workers start, never here
+    check_schema_version()
+    if settings.face_index_snapshot_path:
+        # Rows registered after the snapshot are picked up on the next sync
+        face_index.load(settings.face_index_snapshot_path)
+    # Reads every embedding not in the snapshot; registrations made before
+    # it finishes are checked for duplicates once it does
+    face_index.start_build(SessionLocal)
+    # Models load in the background so the worker can answer health checks
+    # while warming up; /api/health/ready reports 503 until they are warm.
+    inference_executor.start(preload=settings.preload_models)
+    rollup_reconciler.start(SessionLocal)
+    frame_sweeper.start(SessionLocal)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    inference_executor.shutdown()
+    rollup_reconciler.stop()
+    frame_sweeper.stop()
+    if settings.face_index_snapshot_path:
+        face_index.save(settings.face_index_snapshot_path)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
@@ -0,0 +1,89 @@
+"""
+Versioned schema migrations. Each migration is applied once, in order, in
+its own transaction, and recorded in the schema_migrations table. Run them
+before starting the API with:
+
+    python -m app.migrations
+"""
+import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select, text
+from app.migrations import (
+    m0001_initial_schema,
+    m0002_users_role,
+    m0003_proctor_logs_frame_id,
+    m0004_binary_face_embeddings,
+    m0005_user_faces_duplicate_of,
+    m0006_hot_path_indexes,
+    m0007_frame_retention_indexes,
+    m0008_proctor_logs_reused,
+    m0009_backfill_event_rollups,
+    m0010_users_token_version,
+    m0011_drop_exam_event_counts,
+)
+
+MIGRATIONS = [
+    (1, "initial_schema", m0001_initial_schema.upgrade),
+    (2, "users_role", m0002_users_role.upgrade),
+    (3, "proctor_logs_frame_id", m0003_proctor_logs_frame_id.upgrade),
+    (4, "binary_face_embeddings", m0004_binary_face_embeddings.upgrade),
+    (5, "user_faces_duplicate_of", m0005_user_faces_duplicate_of.upgrade),
+    (6, "hot_path_indexes", m0006_hot_path_indexes.upgrade),
+    (7, "frame_retention_indexes", m0007_frame_retention_indexes.upgrade),
+    (8, "proctor_logs_reused", m0008_proctor_logs_reused.upgrade),
+    (9, "backfill_event_rollups", m0009_backfill_event_rollups.upgrade),
+    (10, "users_token_version", m0010_users_token_version.upgrade),
+    (11, "drop_exam_event_counts", m0011_drop_exam_event_counts.upgrade),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Serializes concurrent migrators, e.g. several containers starting at once
+_ADVISORY_LOCK_KEY = 4_815_162_342
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.datetime.utcnow),
+)
+
+def applied_versions(connection) -> set:
+    schema_migrations.create(connection, checkfirst=True)
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+def schema_version(engine) -> int:
+    """
+    Returns the highest applied migration, or 0 for an unmigrated database.
+    """
+    with engine.connect() as connection:
+        if not connection.dialect.has_table(connection, "schema_migrations"):
+            return 0
+        return connection.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc())).scalar() or 0
+
+def migrate(engine) -> list:
+    """
+    Applies all pending migrations and returns their versions.
+    """
+    applied = []
+    with engine.connect() as connection:
+        postgres = connection.dialect.name == "postgresql"
+        if postgres:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+            connection.commit()
+        try:
+            done = applied_versions(connection)
+            connection.commit()
+            for version, name, upgrade in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"Applying migration {version}: {name}")
+                upgrade(connection)
+                connection.execute(schema_migrations.insert().values(version=version, name=name))
+                connection.commit()
+                applied.append(version)
+        finally:
+            connection.rollback()
+            if postgres:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+                connection.commit()
+    return applied
@@ -0,0 +1,6 @@
+from app.core.database import engine
+from app.migrations import migrate
+
+if __name__ == "__main__":
+    applied = migrate(engine)
+    print(f"Applied {len(applied)} migration(s)" if applied else "Database schema is up to date")
@@ -0,0 +1,11 @@
+from sqlalchemy import inspect, text
+
+def column_names(connection, table: str) -> list:
+    return [col['name'] for col in inspect(connection).get_columns(table)]
+
+def add_column_if_missing(connection, table: str, column: str, ddl: str):
+    if column not in column_names(connection, table):
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+def create_index_if_missing(connection, name: str, table: str, columns: list):
+    connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'))
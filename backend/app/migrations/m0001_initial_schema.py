@@ -0,0 +1,119 @@
+"""
+Creates any table that does not exist yet. Existing deployments were
+bootstrapped with create_all, so this only fills gaps; the migrations
+after it bring older tables up to date.
+
+The tables are frozen here as the models defined them when this migration
+was written, so later model changes never alter what it creates.
+"""
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table, Text,
+    UniqueConstraint,
+)
+
+metadata = MetaData()
+
+Table(
+    'users', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('name', String, nullable=False),
+    Column('email', String, unique=True, index=True, nullable=False),
+    Column('password_hash', String, nullable=False),
+    Column('role', String, nullable=False),
+)
+
+Table(
+    'exams', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('title', String, nullable=False),
+    Column('description', Text),
+    Column('owner_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('duration_minutes', Integer, nullable=False),
+    Column('created_at', DateTime),
+    Column('is_active', Boolean),
+)
+
+Table(
+    'questions', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('exam_id', Integer, ForeignKey('exams.id'), nullable=False),
+    Column('text', Text, nullable=False),
+    Column('options', JSON, nullable=False),
+    Column('correct_option', String, nullable=False),
+    Column('marks', Integer, nullable=False),
+    Column('created_at', DateTime),
+    Index('ix_questions_exam_id_id', 'exam_id', 'id'),
+)
+
+Table(
+    'submissions', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('exam_id', Integer, ForeignKey('exams.id'), nullable=False),
+    Column('session_id', String, index=True, nullable=True),
+    Column('answers', JSON, nullable=False),
+    Column('score', Integer, nullable=False),
+    Column('submitted_at', DateTime),
+    Column('duration_seconds', Integer),
+    Index('ix_submissions_user_id_exam_id', 'user_id', 'exam_id'),
+    Index('ix_submissions_exam_id_submitted_at', 'exam_id', 'submitted_at', 'id'),
+    Index('ix_submissions_submitted_at', 'submitted_at', 'id'),
+)
+
+Table(
+    'exam_assignments', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('exam_id', Integer, ForeignKey('exams.id'), nullable=False),
+    UniqueConstraint('user_id', 'exam_id', name='_user_exam_uc'),
+)
+
+Table(
+    'proctor_logs', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('exam_id', Integer, ForeignKey('exams.id'), nullable=False),
+    Column('session_id', String, index=True, nullable=False),
+    Column('frame_id', String, index=True, nullable=True),
+    Column('event_type', String, nullable=False),
+    Column('image_path', String, nullable=True),
+    Column('audio_path', String, nullable=True),
+    Column('timestamp', DateTime),
+    Index('ix_proctor_logs_exam_id_timestamp', 'exam_id', 'timestamp', 'id'),
+    Index('ix_proctor_logs_exam_id_event_type', 'exam_id', 'event_type', 'timestamp', 'id'),
+    Index('ix_proctor_logs_session_id_user_id', 'session_id', 'user_id', 'id'),
+)
+
+Table(
+    'exam_event_counts', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('exam_id', Integer, ForeignKey('exams.id'), nullable=False),
+    Column('event_type', String, nullable=False),
+    Column('count', Integer, nullable=False),
+    UniqueConstraint('exam_id', 'event_type', name='_exam_event_uc'),
+)
+
+Table(
+    'session_event_counts', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('exam_id', Integer, ForeignKey('exams.id'), nullable=False),
+    Column('session_id', String, nullable=False),
+    Column('event_type', String, nullable=False),
+    Column('count', Integer, nullable=False),
+    UniqueConstraint('exam_id', 'session_id', 'event_type', name='_session_event_uc'),
+)
+
+Table(
+    'user_faces', metadata,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('embedding', LargeBinary, nullable=True),
+    Column('embedding_vector', JSON, nullable=True),
+    Column('image_path', String, nullable=False),
+    Column('duplicate_of_user_id', Integer, ForeignKey('users.id'), nullable=True),
+    Column('created_at', DateTime),
+    Index('ix_user_faces_user_id_id', 'user_id', 'id'),
+)
+
+def upgrade(connection):
+    metadata.create_all(bind=connection)
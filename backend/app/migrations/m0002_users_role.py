@@ -0,0 +1,7 @@
+"""
+Adds users.role.
+"""
+from app.migrations.helpers import add_column_if_missing
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'users', 'role', 'VARCHAR NOT NULL DEFAULT \'user\'')
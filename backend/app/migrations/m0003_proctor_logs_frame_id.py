@@ -0,0 +1,9 @@
+"""
+Adds proctor_logs.frame_id, which links asynchronously analyzed frames to
+their log rows.
+"""
+from app.migrations.helpers import add_column_if_missing, create_index_if_missing
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'proctor_logs', 'frame_id', 'VARCHAR')
+    create_index_if_missing(connection, 'ix_proctor_logs_frame_id', 'proctor_logs', ['frame_id'])
@@ -0,0 +1,40 @@
+"""
+Adds the binary user_faces.embedding column and converts the legacy JSON
+embedding_vector lists into it in batches.
+"""
+import numpy as np
+from sqlalchemy import JSON, Column, Integer, LargeBinary, MetaData, Table, bindparam, inspect, select, text, update
+from app.migrations.helpers import add_column_if_missing
+
+BATCH_SIZE = 500
+
+# The columns this migration reads and writes, frozen as of this version
+faces = Table(
+    'user_faces', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('embedding_vector', JSON),
+    Column('embedding', LargeBinary),
+)
+
+def encode(vector) -> bytes:
+    # Raw little-endian float32, the format the embedding column stores
+    return np.asarray(vector, dtype='<f4').tobytes()
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'user_faces', 'embedding', LargeBinary().compile(dialect=connection.dialect))
+    legacy = next(col for col in inspect(connection).get_columns('user_faces') if col['name'] == 'embedding_vector')
+    if not legacy['nullable'] and connection.dialect.name == 'postgresql':
+        connection.execute(text('ALTER TABLE user_faces ALTER COLUMN embedding_vector DROP NOT NULL'))
+
+    while True:
+        rows = connection.execute(
+            select(faces.c.id, faces.c.embedding_vector)
+            .where(faces.c.embedding.is_(None), faces.c.embedding_vector.isnot(None))
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            update(faces).where(faces.c.id == bindparam('face_id')).values(embedding=bindparam('blob')),
+            [{'face_id': id, 'blob': encode(vector)} for id, vector in rows]
+        )
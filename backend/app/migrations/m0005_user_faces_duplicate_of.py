@@ -0,0 +1,8 @@
+"""
+Adds user_faces.duplicate_of_user_id, set when a registered face matches
+another account's.
+"""
+from app.migrations.helpers import add_column_if_missing
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'user_faces', 'duplicate_of_user_id', 'INTEGER REFERENCES users(id)')
@@ -0,0 +1,30 @@
+"""
+Composite indexes for the list, export, rollup and grading queries:
+
+- proctor_logs (exam_id, timestamp, id): /proctor/logs pages, newest first
+- proctor_logs (exam_id, event_type, timestamp, id): the event_type filter
+  and the rollup rebuild's GROUP BY
+- proctor_logs (session_id, user_id, id): a candidate's session events
+- submissions (user_id, exam_id): /exams/my-submissions and the
+  submitted-already check of demo exam assignment
+- submissions (exam_id, submitted_at, id) and (submitted_at, id): admin
+  submission pages with and without an exam filter
+- questions (exam_id, id): exam detail loads and answer key compiles
+- user_faces (user_id, id): the newest baseline face of a user
+"""
+from app.migrations.helpers import create_index_if_missing
+
+INDEXES = [
+    ('ix_proctor_logs_exam_id_timestamp', 'proctor_logs', ['exam_id', 'timestamp', 'id']),
+    ('ix_proctor_logs_exam_id_event_type', 'proctor_logs', ['exam_id', 'event_type', 'timestamp', 'id']),
+    ('ix_proctor_logs_session_id_user_id', 'proctor_logs', ['session_id', 'user_id', 'id']),
+    ('ix_submissions_user_id_exam_id', 'submissions', ['user_id', 'exam_id']),
+    ('ix_submissions_exam_id_submitted_at', 'submissions', ['exam_id', 'submitted_at', 'id']),
+    ('ix_submissions_submitted_at', 'submissions', ['submitted_at', 'id']),
+    ('ix_questions_exam_id_id', 'questions', ['exam_id', 'id']),
+    ('ix_user_faces_user_id_id', 'user_faces', ['user_id', 'id']),
+]
+
+def upgrade(connection):
+    for name, table, columns in INDEXES:
+        create_index_if_missing(connection, name, table, columns)
@@ -0,0 +1,15 @@
+"""
+Indexes for the frame sweeper: expired rows are found by (event_type,
+timestamp), and a file is deleted only once no row refers to its path.
+"""
+from app.migrations.helpers import create_index_if_missing
+
+INDEXES = [
+    ('ix_proctor_logs_event_type_timestamp', 'proctor_logs', ['event_type', 'timestamp']),
+    ('ix_proctor_logs_image_path', 'proctor_logs', ['image_path']),
+    ('ix_user_faces_image_path', 'user_faces', ['image_path']),
+]
+
+def upgrade(connection):
+    for name, table, columns in INDEXES:
+        create_index_if_missing(connection, name, table, columns)
@@ -0,0 +1,8 @@
+"""
+Adds proctor_logs.reused, which marks verdicts copied from the session's
+previous frame by the frame gate rather than inferred.
+"""
+from app.migrations.helpers import add_column_if_missing
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'proctor_logs', 'reused', 'BOOLEAN NOT NULL DEFAULT FALSE')
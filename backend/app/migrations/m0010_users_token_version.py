@@ -0,0 +1,8 @@
+"""
+Adds users.token_version, which access tokens carry as their "ver" claim.
+Bumping it revokes every token issued to the user so far.
+"""
+from app.migrations.helpers import add_column_if_missing
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'users', 'token_version', 'INTEGER NOT NULL DEFAULT 0')
@@ -0,0 +1,8 @@
+"""
+Drops exam_event_counts. Exam totals are now summed from
+session_event_counts, so frames no longer contend on one row per exam.
+"""
+from sqlalchemy import text
+
+def upgrade(connection):
+    connection.execute(text('DROP TABLE IF EXISTS exam_event_counts'))
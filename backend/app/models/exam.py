@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 import datetime
@@ -29,6 +29,8 @@ class Question(Base):
 
     exam = relationship("Exam", back_populates="questions")
 
+    __table_args__ = (Index('ix_questions_exam_id_id', 'exam_id', 'id'),)
+
 class Submission(Base):
     __tablename__ = 'submissions'
     id = Column(Integer, primary_key=True, index=True)
@@ -42,3 +44,9 @@ class Submission(Base):
 
     candidate = relationship("User")
     exam = relationship("Exam")
+
+    __table_args__ = (
+        Index('ix_submissions_user_id_exam_id', 'user_id', 'exam_id'),
+        Index('ix_submissions_exam_id_submitted_at', 'exam_id', 'submitted_at', 'id'),
+        Index('ix_submissions_submitted_at', 'submitted_at', 'id'),
+    )
@@ -1,7 +1,34 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, false, ForeignKey, JSON, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from app.core.database import Base
 import datetime
+import numpy as np
+
+# Embeddings are stored as raw little-endian float32, whatever the host
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+def encode_embedding(embedding) -> bytes:
+    return np.ascontiguousarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    # Zero-copy, read-only view over the bytes returned by the driver
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+class EmbeddingType(TypeDecorator):
+    """
+    Stores a face embedding as a compact float32 blob and loads it back as a
+    numpy array. A 4096-d VGG-Face vector takes 16 KiB instead of ~80 KiB of
+    JSON text, and reading it needs no parsing.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode_embedding(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decode_embedding(value)
 
 class ProctorLog(Base):
     __tablename__ = 'proctor_logs'
@@ -9,20 +36,53 @@ class ProctorLog(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     exam_id = Column(Integer, ForeignKey('exams.id'), nullable=False)
     session_id = Column(String, index=True, nullable=False)
+    # Set for frames ingested asynchronously so clients can match results
+    frame_id = Column(String, index=True, nullable=True)
     event_type = Column(String, nullable=False)
-    image_path = Column(String, nullable=True)
+    # True when the verdict was copied from the session's previous frame by
+    # the frame gate instead of being inferred
+    reused = Column(Boolean, nullable=False, default=False, server_default=false())
+    image_path = Column(String, nullable=True, index=True)
     audio_path = Column(String, nullable=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
     user = relationship("User")
     exam = relationship("Exam")
 
+    __table_args__ = (
+        Index('ix_proctor_logs_exam_id_timestamp', 'exam_id', 'timestamp', 'id'),
+        Index('ix_proctor_logs_exam_id_event_type', 'exam_id', 'event_type', 'timestamp', 'id'),
+        Index('ix_proctor_logs_session_id_user_id', 'session_id', 'user_id', 'id'),
+        Index('ix_proctor_logs_event_type_timestamp', 'event_type', 'timestamp'),
+    )
+
+class SessionEventCount(Base):
+    """
+    Running count of ProctorLog rows per (exam, session, event type), kept
+    up to date by every logged frame so summaries never scan the logs.
+    Exam totals are the sum over the exam's sessions.
+    """
+    __tablename__ = 'session_event_counts'
+    id = Column(Integer, primary_key=True, index=True)
+    exam_id = Column(Integer, ForeignKey('exams.id'), nullable=False)
+    session_id = Column(String, nullable=False)
+    event_type = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (UniqueConstraint('exam_id', 'session_id', 'event_type', name='_session_event_uc'),)
+
 class UserFace(Base):
     __tablename__ = 'user_faces'
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    embedding_vector = Column(JSON, nullable=False)
-    image_path = Column(String, nullable=False)
+    embedding = Column(EmbeddingType, nullable=True)
+    # Legacy JSON list, kept for rows written before the binary column existed
+    embedding_vector = Column(JSON, nullable=True)
+    image_path = Column(String, nullable=False, index=True)
+    # Another user whose registered face matched this one at registration
+    duplicate_of_user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    user = relationship("User", back_populates="face_embedding")
+    user = relationship("User", back_populates="face_embedding", foreign_keys=[user_id])
+
+    __table_args__ = (Index('ix_user_faces_user_id_id', 'user_id', 'id'),)
@@ -11,8 +11,10 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     role = Column(String, default="user", nullable=False)
+    # Bumped to revoke every access token issued to the user so far
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
 
-    face_embedding = relationship("UserFace", uselist=False, back_populates="user")
+    face_embedding = relationship("UserFace", uselist=False, back_populates="user", foreign_keys=[UserFace.user_id])
     assignments = relationship("ExamAssignment", back_populates="user")
 
     is_face_registered = column_property(
@@ -1,50 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.user import User
-from app.models.exam import Submission
-from app.models.assignment import ExamAssignment
-from app.core.security import verify_password, hash_password, create_access_token
+from app.core.security import Principal, create_user_access_token, get_current_principal, hash_password_async, revoke_user_tokens, verify_password_async
 from app.schemas.user_schema import RegisterSchema
-from app.core.demo_exam import get_or_create_demo_exam
+from app.core.demo_exam import assign_demo_exam
 
 router = APIRouter()
 
-@router.post("/register")
-def register(payload: RegisterSchema, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == payload.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
+def find_user_by_email(db: Session, email: str):
+    # Only the columns login needs; skips the is_face_registered subquery
+    return db.query(User.id, User.email, User.role, User.token_version, User.password_hash).filter(User.email == email).first()
 
-    hashed_pw = hash_password(payload.password[:72])
+def create_user(db: Session, payload: RegisterSchema, password_hash: str):
     user = User(
         name=payload.name,
         email=payload.email,
-        password_hash=hashed_pw
+        password_hash=password_hash
     )
     db.add(user)
     db.commit()
-    db.refresh(user)
+
+@router.post("/register")
+async def register(payload: RegisterSchema, db: Session = Depends(get_db)):
+    if await run_in_threadpool(find_user_by_email, db, payload.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    hashed_pw = await hash_password_async(payload.password[:72])
+    await run_in_threadpool(create_user, db, payload, hashed_pw)
     return {"msg": "registered"}
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     email = form_data.username   # Swagger sends "username", not "email"
     password = form_data.password
 
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.password_hash):
+    user = await run_in_threadpool(find_user_by_email, db, email)
+    if not user or not await verify_password_async(password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # Assign demo exam if not completed
-    demo_exam = get_or_create_demo_exam(db)
-    submission = db.query(Submission).filter(Submission.user_id == user.id, Submission.exam_id == demo_exam.id).first()
-    if not submission:
-        assignment = db.query(ExamAssignment).filter(ExamAssignment.user_id == user.id, ExamAssignment.exam_id == demo_exam.id).first()
-        if not assignment:
-            new_assignment = ExamAssignment(user_id=user.id, exam_id=demo_exam.id)
-            db.add(new_assignment)
-            db.commit()
-
-    token = create_access_token({"sub": user.email})
+    await run_in_threadpool(assign_demo_exam, db, user.id)
+
+    token = create_user_access_token(user)
     return {"access_token": token, "token_type": "bearer"}
+
+@router.post("/logout")
+def logout(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """
+    Revokes every access token of the caller, on all of their devices.
+    """
+    revoke_user_tokens(db, current_user.id)
+    return {"msg": "logged out"}
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import get_current_user
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
+from app.core.database import get_db, get_async_db, run_db
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, select_columns
+from app.core.security import Principal, get_current_principal, get_current_user
 from app.models.user import User
 from app.models.exam import Exam, Question, Submission
 from app.models.assignment import ExamAssignment
-from app.schemas.exam_schema import AdminStatsSchema, ExamUpdateSchema, ExamResponseSchema, ExamSchema, SubmissionSchema, ExamDetailSchema, AssignmentSchema
-from typing import List
+from app.services.answer_keys import AnswerKey, answer_keys
+from app.services.assignments import assign_candidates
+from app.services.exam_snapshots import etag_matches, exam_snapshots
+from app.services.question_import import import_questions
+from app.core.demo_exam import forget_demo_exam
+from app.routers.submissions import SUBMISSION_FIELDS
+from app.schemas.exam_schema import AdminStatsSchema, ExamUpdateSchema, ExamResponseSchema, ExamSchema, SubmissionSchema, ExamDetailSchema, AssignmentSchema, BulkAssignmentSchema
+from typing import List, Optional
 
 router = APIRouter(prefix="/exams", tags=["exams"])
 
@@ -22,22 +30,40 @@ def create_exam(exam_data: ExamSchema, db: Session = Depends(get_db), current_us
         owner_id=current_user.id
     )
     db.add(exam)
-    db.commit()
-    db.refresh(exam)
+    db.flush()
 
-    for q in exam_data.questions:
-        question = Question(
-            exam_id=exam.id,
-            text=q.text,
-            options=q.options,
-            correct_option=q.correct_option,
-            marks=q.marks
-        )
-        db.add(question)
+    if exam_data.questions:
+        db.execute(insert(Question), [{"exam_id": exam.id, **q.dict()} for q in exam_data.questions])
     db.commit()
+    db.refresh(exam)
 
     return exam
 
+@router.post("/{exam_id}/questions/import")
+def import_exam_questions(
+    exam_id: int,
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(jsonl|csv)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Bulk-adds questions to an exam from a JSON-lines or CSV upload. The
+    format defaults to the file extension. Returns counts and the line
+    numbers of rejected rows.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can import questions")
+
+    if db.query(Exam.id).filter(Exam.id == exam_id).scalar() is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "jsonl")
+    report = import_questions(db, exam_id, file.file, format)
+    answer_keys.invalidate(exam_id)
+    exam_snapshots.invalidate(exam_id)
+    return report
+
 @router.get("/", response_model=List[ExamResponseSchema])
 def get_assigned_exams(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if current_user.role == "admin":
@@ -46,41 +72,91 @@ def get_assigned_exams(db: Session = Depends(get_db), current_user: User = Depen
         exams = db.query(Exam).join(ExamAssignment).filter(ExamAssignment.user_id == current_user.id).all()
     return exams
 
-@router.get("/{exam_id}", response_model=ExamDetailSchema)
-def get_exam(exam_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+# Registered before /{exam_id} so the literal path is not captured as an exam id
+@router.get("/my-submissions")
+def get_my_submissions(
+    response: Response,
+    exam_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    columns = select_columns(Submission, fields, SUBMISSION_FIELDS)
+    query = db.query(Submission).filter(Submission.user_id == current_user.id)
+    if exam_id is not None:
+        query = query.filter(Submission.exam_id == exam_id)
+    return keyset_page(query, columns, Submission.submitted_at, Submission.id, cursor, limit, response)
+
+def load_exam_detail(db: Session, exam_id: int):
+    # Load the questions with the exam so serialization doesn't lazy-load them
+    return db.query(Exam).options(selectinload(Exam.questions)).filter(Exam.id == exam_id).first()
+
+def load_exam_body(db: Session, exam_id: int):
+    exam = load_exam_detail(db, exam_id)
     if not exam:
-        raise HTTPException(status_code=404, detail="Exam not found")
-    return exam
+        return None
+    return ExamDetailSchema.model_validate(exam, from_attributes=True).model_dump_json().encode()
 
-@router.post("/submit")
-def submit_exam(submission_data: SubmissionSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    exam = db.query(Exam).filter(Exam.id == submission_data.exam_id).first()
-    if not exam:
+@router.get("/{exam_id}", response_model=ExamDetailSchema)
+async def get_exam(exam_id: int, request: Request, db: Session = Depends(get_db), async_db = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
+    """
+    Serves the exam from its cached snapshot: 304 when the client's ETag is
+    current, otherwise the pre-encoded body, gzipped if the client accepts it.
+    """
+    snapshot = await exam_snapshots.get(exam_id, lambda: run_db(db, async_db, load_exam_body, exam_id))
+    if snapshot is None:
         raise HTTPException(status_code=404, detail="Exam not found")
 
-    score = 0
-    for question_id, answer in submission_data.answers.items():
-        question = db.query(Question).filter(Question.id == question_id).first()
-        if question and question.correct_option == answer:
-            score += question.marks
+    headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match", ""), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    if snapshot.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(snapshot.gzip_body, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+def load_answer_key(db: Session, exam_id: int):
+    if db.query(Exam.id).filter(Exam.id == exam_id).scalar() is None:
+        return None
+    return AnswerKey.compile(db, exam_id)
+
+def store_submission(db: Session, user_id: int, submission_data: SubmissionSchema, answer_key: AnswerKey):
+    """
+    Grades and stores a submission. Returns the score, or None if the exam
+    does not exist.
+    """
+    exam_id = db.query(Exam.id).filter(Exam.id == submission_data.exam_id).scalar()
+    if exam_id is None:
+        return None
+
+    # Answers to questions that are not part of this exam score nothing
+    score = answer_key.grade(submission_data.answers)
 
     submission = Submission(
-        user_id=current_user.id,
-        exam_id=submission_data.exam_id,
+        user_id=user_id,
+        exam_id=exam_id,
         answers=submission_data.answers,
         score=score,
         duration_seconds=submission_data.duration_seconds
     )
     db.add(submission)
     db.commit()
+    return score
 
-    return {"msg": "submitted", "score": score}
+@router.post("/submit")
+async def submit_exam(submission_data: SubmissionSchema, db: Session = Depends(get_db), async_db = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
+    # Grade against the exam's compiled answer key, cached per exam so a
+    # mass submit reads no questions
+    exam_id = submission_data.exam_id
+    answer_key = await answer_keys.get(exam_id, lambda: run_db(db, async_db, load_answer_key, exam_id))
+    score = None
+    if answer_key is not None:
+        score = await run_db(db, async_db, store_submission, current_user.id, submission_data, answer_key)
+    if score is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
 
-@router.get("/my-submissions")
-def get_my_submissions(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    submissions = db.query(Submission).filter(Submission.user_id == current_user.id).all()
-    return submissions
+    return {"msg": "submitted", "score": score}
 
 @router.put("/{exam_id}", response_model=ExamResponseSchema)
 def update_exam(exam_id: int, exam_data: ExamUpdateSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -91,12 +167,19 @@ def update_exam(exam_id: int, exam_data: ExamUpdateSchema, db: Session = Depends
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
 
+    activated = exam_data.is_active and not exam.is_active
     exam.title = exam_data.title
     exam.description = exam_data.description
     exam.duration_minutes = exam_data.duration_minutes
     exam.is_active = exam_data.is_active
     db.commit()
     db.refresh(exam)
+
+    answer_keys.invalidate(exam.id)
+    exam_snapshots.invalidate(exam.id)
+    if activated:
+        # Compile the key now so the first submissions don't have to
+        answer_keys.compile(db, exam.id)
     return exam
 
 @router.delete("/{exam_id}", status_code=204)
@@ -110,6 +193,9 @@ def delete_exam(exam_id: int, db: Session = Depends(get_db), current_user: User
 
     db.delete(exam)
     db.commit()
+    answer_keys.invalidate(exam_id)
+    exam_snapshots.invalidate(exam_id)
+    forget_demo_exam(exam_id)
     return {"ok": True}
 
 @router.post("/{exam_id}/assign")
@@ -129,3 +215,17 @@ def assign_exam(exam_id: int, assignment_data: AssignmentSchema, db: Session = D
     db.add(assignment)
     db.commit()
     return {"message": "Exam assigned successfully"}
+
+@router.post("/{exam_id}/assign/bulk")
+def assign_exam_bulk(exam_id: int, assignment_data: BulkAssignmentSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Assigns the exam to a list of candidates, or to every candidate, in a
+    few set-based statements. Reports inserted and skipped counts.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can assign exams")
+
+    if db.query(Exam.id).filter(Exam.id == exam_id).scalar() is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    return assign_candidates(db, exam_id, assignment_data.user_ids, assignment_data.not_submitted)
@@ -1,7 +1,15 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.inference import inference_executor
 
 router = APIRouter()
 
 @router.get("/health")
 def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "models_ready": inference_executor.is_ready()}
+
+@router.get("/health/ready")
+def readiness_check():
+    if not inference_executor.is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming_up", "models_ready": False})
+    return {"status": "ready", "models_ready": True}
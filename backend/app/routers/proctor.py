@@ -1,119 +1,446 @@
+import asyncio
+import datetime
+import time
 import uuid
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.export import export_response
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, select_columns
+from app.core.database import get_db, get_async_db, run_db, run_in_new_session
+from app.core.security import Principal, get_current_principal, get_current_user, get_principal_from_token
 from app.models.user import User
 from app.models.proctor import UserFace, ProctorLog
-from app.services.proctoring import generate_embedding, analyze_face
-import shutil
-from pathlib import Path
-from typing import List
+from app.core.config import settings
+from app.services.proctoring import analyze_frame, embedding_from_bytes, frame_gate, frame_signature
+from app.services.inference import inference_executor, InferenceQueueFull
+from app.services.frame_ingest import frame_ingest
+from app.services.baseline_cache import baseline_cache
+from app.services.face_index import check_registration, face_index
+from app.services.frame_store import frame_store
+from app.services.rollups import exam_event_counts, rebuild_event_counts, record_event, session_event_counts
+from collections import defaultdict
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Set
 
 router = APIRouter()
 
-UPLOAD_DIR = Path("/app/uploads")
+async def run_inference(fn, *args):
+    """
+    Runs fn on the inference executor without holding a request thread.
+    Raises InferenceQueueFull when the executor's backlog is full.
+    """
+    return await asyncio.wrap_future(inference_executor.submit(fn, *args))
 
-@router.post("/register_face")
-def register_face(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-    file: UploadFile = File(...)
-):
-    # Ensure the uploads directory exists
-    UPLOAD_DIR.mkdir(exist_ok=True)
+def get_baseline_embedding(db: Session, user_id: int):
+    # The most recent registration is the baseline
+    user_face = db.query(UserFace.embedding, UserFace.embedding_vector).filter(UserFace.user_id == user_id).order_by(UserFace.id.desc()).first()
+    if user_face is None:
+        return None
+    return user_face.embedding if user_face.embedding is not None else user_face.embedding_vector
 
-    # Save the uploaded file
-    file_extension = Path(file.filename).suffix
-    image_filename = f"{uuid.uuid4()}{file_extension}"
-    image_path = UPLOAD_DIR / image_filename
+async def load_baseline_embedding(db: Session, async_db, user_id: int):
+    """
+    Returns the user's normalized float32 baseline embedding, reading the
+    database only on a cache miss.
+    """
+    baseline = baseline_cache.get(user_id)
+    if baseline is None:
+        embedding = await run_db(db, async_db, get_baseline_embedding, user_id)
+        if embedding is not None:
+            baseline = baseline_cache.put(user_id, embedding)
+    return baseline
 
-    with image_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+async def run_inference_when_free(fn, *args):
+    """
+    Like run_inference, but waits for executor capacity instead of raising
+    InferenceQueueFull, and retries once on a fresh pool if a worker process
+    died while running the task.
+    """
+    delay = 0.005
+    retried = False
+    while True:
+        try:
+            return await run_inference(fn, *args)
+        except InferenceQueueFull:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        except BrokenProcessPool:
+            if retried:
+                raise
+            retried = True
 
-    # Generate face embedding
-    embedding = generate_embedding(str(image_path))
-    if not embedding:
-        raise HTTPException(status_code=400, detail="Could not detect a face in the image.")
+async def analyze_or_defer(data: bytes, baseline_embedding, session_key=None, wait: bool = False):
+    """
+    Analyzes a frame on the inference executor. When the executor is
+    saturated the frame is reported as deferred right away instead of
+    queueing behind every other candidate, unless wait is set, in which
+    case it waits for capacity.
 
-    # Save the embedding to the database
+    If a session_key is given, frames that have not changed since the
+    session's last analyzed frame reuse its verdict without inference.
+    Returns (event_type, timings, reused), reused being True for those.
+    """
+    signature = None
+    if session_key is not None:
+        started = time.perf_counter()
+        # Decoding the thumbnail takes milliseconds at 1080p; keep it off
+        # the event loop
+        signature = await run_in_threadpool(frame_signature, data)
+        reused_event = frame_gate.check(session_key, signature)
+        gate_ms = (time.perf_counter() - started) * 1000
+        if reused_event is not None:
+            return reused_event, {"gate": gate_ms}, True
+
+    try:
+        if wait:
+            event_type, timings = await run_inference_when_free(analyze_frame, data, baseline_embedding)
+        else:
+            event_type, timings = await run_inference(analyze_frame, data, baseline_embedding)
+    except InferenceQueueFull:
+        return "deferred", {}, False
+    except BrokenProcessPool:
+        # A worker process died mid-task; the executor has replaced its pool
+        print("Inference worker died while analyzing a frame")
+        return ("error" if wait else "deferred"), {}, False
+
+    if session_key is not None:
+        frame_gate.update(session_key, signature, event_type)
+        timings["gate"] = gate_ms
+    return event_type, timings, False
+
+def log_event(db: Session, user_id: int, exam_id: int, session_id: str, event_type: str, image_path=None, frame_id=None, reused: bool = False):
+    proctor_log = ProctorLog(
+        user_id=user_id,
+        exam_id=exam_id,
+        session_id=session_id,
+        frame_id=frame_id,
+        event_type=event_type,
+        image_path=image_path,
+        reused=reused
+    )
+    db.add(proctor_log)
+    record_event(db, exam_id, session_id, event_type)
+    db.commit()
+
+def save_registration(db: Session, user_id: int, embedding: list, data: bytes, filename: str):
+    """
+    Stores a new baseline face and checks it against every other user's.
+    A match is recorded on the row for admins to review; it is never
+    reported to the candidate. Until the face index has finished building
+    the check is deferred to the end of the build.
+    """
     user_face = UserFace(
-        user_id=current_user.id,
-        embedding_vector=embedding,
-        image_path=str(image_path)
+        user_id=user_id,
+        embedding=embedding,
+        image_path=frame_store.put(data, filename)
     )
     db.add(user_face)
     db.commit()
+    if not face_index.defer_check(user_face.id):
+        check_registration(db, user_face.id)
+
+@router.post("/register_face")
+async def register_face(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+    file: UploadFile = File(...)
+):
+    # Decode and embed the upload in memory on the inference executor
+    data = await file.read()
+    try:
+        embedding = await run_inference(embedding_from_bytes, data)
+    except InferenceQueueFull:
+        raise HTTPException(status_code=503, detail="Face registration is busy, please retry.", headers={"Retry-After": "1"})
+    if not embedding:
+        raise HTTPException(status_code=400, detail="Could not detect a face in the image.")
+
+    # Save the embedding to the database
+    await run_in_threadpool(save_registration, db, current_user.id, embedding, data, file.filename)
+    baseline_cache.invalidate(current_user.id)
 
     return {"message": "Face registered successfully."}
 
 @router.post("/frame")
-def frame(
+async def frame(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    async_db = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
     exam_id: int = Form(...),
     session_id: str = Form(...),
     file: UploadFile = File(...)
 ):
-    # Ensure the uploads directory exists
-    UPLOAD_DIR.mkdir(exist_ok=True)
-
     # Get the baseline embedding for the user
-    user_face = db.query(UserFace).filter(UserFace.user_id == current_user.id).first()
-    if not user_face:
+    baseline_embedding = await load_baseline_embedding(db, async_db, current_user.id)
+    if baseline_embedding is None:
         raise HTTPException(status_code=400, detail="No baseline face registered for this user.")
 
-    baseline_embedding = user_face.embedding_vector
+    # Analyze the face in the frame straight from the decoded upload
+    data = await file.read()
+    event_type, timings, reused = await analyze_or_defer(data, baseline_embedding, (current_user.id, session_id))
 
-    # Save the uploaded file
-    file_extension = Path(file.filename).suffix
-    image_filename = f"{uuid.uuid4()}{file_extension}"
-    image_path = UPLOAD_DIR / image_filename
+    # Persisting the frame is a separate, optional step
+    image_path = None
+    if settings.persist_frame_images:
+        image_path = await run_in_threadpool(frame_store.put, data, file.filename)
 
-    with image_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Log the event
+    await run_db(db, async_db, log_event, current_user.id, exam_id, session_id, event_type, image_path, None, reused)
 
-    # Analyze the face in the frame
-    event_type = analyze_face(str(image_path), baseline_embedding)
+    return {"event": event_type, "reused": reused, "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()}}
 
-    # Log the event
-    proctor_log = ProctorLog(
-        user_id=current_user.id,
-        exam_id=exam_id,
-        session_id=session_id,
-        event_type=event_type,
-        image_path=str(image_path)
+@router.websocket("/ws")
+async def frame_stream(
+    websocket: WebSocket,
+    token: str = Query(...),
+    exam_id: int = Query(...),
+    session_id: str = Query(...),
+    db: Session = Depends(get_db),
+    async_db = Depends(get_async_db)
+):
+    """
+    Streams proctoring frames over one connection. The client authenticates
+    once with its access token in the query string, then sends each frame
+    as a binary JPEG message and receives {"event": ...} for it on the same
+    socket. The baseline embedding is loaded once per connection.
+    """
+    await websocket.accept()
+
+    user = await run_in_threadpool(get_principal_from_token, token, db)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+
+    baseline_embedding = await load_baseline_embedding(db, async_db, user.id)
+    if baseline_embedding is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="No baseline face registered for this user.")
+        return
+
+    try:
+        while True:
+            data = await websocket.receive_bytes()
+            event_type, timings, reused = await analyze_or_defer(data, baseline_embedding, (user.id, session_id))
+
+            image_path = None
+            if settings.persist_frame_images:
+                image_path = await run_in_threadpool(frame_store.put, data, "frame.jpg")
+            await run_db(db, async_db, log_event, user.id, exam_id, session_id, event_type, image_path, None, reused)
+
+            await websocket.send_json({"event": event_type, "reused": reused, "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()}})
+    except WebSocketDisconnect:
+        pass
+
+# Frames accepted by /frames whose analysis has not been logged yet, keyed
+# by (user_id, session_id). This is per worker process; the ProctorLog
+# rows are the source of truth once analysis completes.
+pending_frames: Dict[tuple, Set[str]] = defaultdict(set)
+
+async def complete_frame(user_id: int, exam_id: int, session_id: str, frame_id: str, data: bytes, filename: str, baseline_embedding):
+    try:
+        # Accepted frames always get a real verdict, so wait for the executor
+        event_type, _, reused = await analyze_or_defer(data, baseline_embedding, (user_id, session_id), wait=True)
+        image_path = None
+        if settings.persist_frame_images:
+            image_path = await run_in_threadpool(frame_store.put, data, filename)
+        # The request's session is closed by the time analysis finishes
+        await run_in_new_session(log_event, user_id, exam_id, session_id, event_type, image_path, frame_id, reused)
+    except Exception as e:
+        print(f"Error completing frame {frame_id}: {e}")
+    finally:
+        pending = pending_frames[(user_id, session_id)]
+        pending.discard(frame_id)
+        if not pending:
+            pending_frames.pop((user_id, session_id), None)
+
+@router.post("/frames", status_code=202)
+async def ingest_frame(
+    db: Session = Depends(get_db),
+    async_db = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
+    exam_id: int = Form(...),
+    session_id: str = Form(...),
+    file: UploadFile = File(...)
+):
+    """
+    Accepts a frame for analysis and returns immediately with its frame id.
+    The ProctorLog row is written once analysis completes; poll
+    /sessions/{session_id}/events for the outcome. Returns 503 when the
+    worker's ingest queue is full.
+    """
+    baseline_embedding = await load_baseline_embedding(db, async_db, current_user.id)
+    if baseline_embedding is None:
+        raise HTTPException(status_code=400, detail="No baseline face registered for this user.")
+
+    data = await file.read()
+    frame_id = uuid.uuid4().hex
+    accepted = frame_ingest.offer(
+        complete_frame, current_user.id, exam_id, session_id, frame_id, data, file.filename, baseline_embedding
     )
-    db.add(proctor_log)
-    db.commit()
+    if not accepted:
+        raise HTTPException(status_code=503, detail="Frame queue is full, please retry.", headers={"Retry-After": "1"})
+    pending_frames[(current_user.id, session_id)].add(frame_id)
+
+    return {"frame_id": frame_id, "status": "queued"}
 
-    return {"event": event_type}
+@router.get("/sessions/{session_id}/events")
+def get_session_events(
+    session_id: str,
+    after_id: int = Query(0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Returns the analyzed events for one of the caller's sessions, oldest
+    first, starting after the given log id, plus the frame ids this worker
+    is still analyzing.
+    """
+    events = db.query(
+        ProctorLog.id, ProctorLog.frame_id, ProctorLog.event_type, ProctorLog.timestamp
+    ).filter(
+        ProctorLog.session_id == session_id,
+        ProctorLog.user_id == current_user.id,
+        ProctorLog.id > after_id
+    ).order_by(ProctorLog.id).limit(limit).all()
+
+    return {
+        "events": [
+            {"id": id, "frame_id": frame_id, "event": event_type, "timestamp": timestamp}
+            for id, frame_id, event_type, timestamp in events
+        ],
+        "pending": sorted(pending_frames.get((current_user.id, session_id), ())),
+    }
+
+@router.get("/stats")
+def get_proctor_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return {
+        "baseline_cache": baseline_cache.stats(),
+        "inference": {
+            "backend": inference_executor.backend,
+            "pending": inference_executor.pending(),
+            "max_pending": inference_executor.max_pending,
+        },
+        "ingest": {
+            "queued": frame_ingest.queued(),
+            "max_queued": frame_ingest.max_queued,
+        },
+    }
+
+DUPLICATE_FIELDS = ["id", "user_id", "duplicate_of_user_id", "image_path", "created_at"]
+
+@router.get("/duplicates")
+def get_duplicate_identities(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Returns registrations whose face matched another account's, newest
+    first, paged by X-Next-Cursor.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    columns = select_columns(UserFace, None, DUPLICATE_FIELDS)
+    query = db.query(UserFace).filter(UserFace.duplicate_of_user_id.isnot(None))
+    return keyset_page(query, columns, UserFace.created_at, UserFace.id, cursor, limit, response)
+
+LOG_FIELDS = ["id", "user_id", "exam_id", "session_id", "frame_id", "event_type", "reused", "image_path", "audio_path", "timestamp"]
+
+def filter_logs(query, exam_id, session_id, user_id, event_type, since, until):
+    query = query.filter(ProctorLog.exam_id == exam_id)
+    if session_id is not None:
+        query = query.filter(ProctorLog.session_id == session_id)
+    if user_id is not None:
+        query = query.filter(ProctorLog.user_id == user_id)
+    if event_type is not None:
+        query = query.filter(ProctorLog.event_type == event_type)
+    if since is not None:
+        query = query.filter(ProctorLog.timestamp >= since)
+    if until is not None:
+        query = query.filter(ProctorLog.timestamp < until)
+    return query
 
 @router.get("/logs")
 def get_proctor_logs(
+    response: Response,
     exam_id: int = Query(...),
+    session_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    """
+    Returns one page of an exam's proctor logs, newest first. Pass the
+    X-Next-Cursor header of a response as ?cursor= to fetch the next page.
+    """
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    logs = db.query(ProctorLog).filter(ProctorLog.exam_id == exam_id).all()
-    return logs
+    columns = select_columns(ProctorLog, fields, LOG_FIELDS)
+    query = filter_logs(db.query(ProctorLog), exam_id, session_id, user_id, event_type, since, until)
+    return keyset_page(query, columns, ProctorLog.timestamp, ProctorLog.id, cursor, limit, response)
+
+@router.get("/logs/export")
+def export_proctor_logs(
+    exam_id: int = Query(...),
+    session_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    fields: Optional[str] = None,
+    format: str = "ndjson",
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Streams every matching proctor log as NDJSON or CSV, in id order.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    columns = select_columns(ProctorLog, fields, LOG_FIELDS)
+    query = filter_logs(db.query(ProctorLog), exam_id, session_id, user_id, event_type, since, until)
+    return export_response(db, query.order_by(ProctorLog.id), columns, format, gzip, f"proctor_logs_exam_{exam_id}")
 
 @router.get("/summary")
 def get_proctor_summary(
     exam_id: int = Query(...),
+    session_id: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    summary = db.query(
-        ProctorLog.event_type,
-        func.count(ProctorLog.event_type)
-    ).filter(ProctorLog.exam_id == exam_id).group_by(ProctorLog.event_type).all()
+    if session_id is not None:
+        return session_event_counts(db, exam_id, session_id)
+    return exam_event_counts(db, exam_id)
+
+@router.post("/summary/rebuild")
+def rebuild_proctor_summary(
+    exam_id: int = Query(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recomputes an exam's event rollups from the raw logs.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
 
-    return {event: count for event, count in summary}
+    rebuild_event_counts(db, exam_id)
+    return exam_event_counts(db, exam_id)
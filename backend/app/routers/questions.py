@@ -5,6 +5,8 @@ from app.core.security import get_current_user
 from app.models.user import User
 from app.models.exam import Question
 from app.schemas.exam_schema import QuestionSchema
+from app.services.answer_keys import answer_keys
+from app.services.exam_snapshots import exam_snapshots
 from typing import List
 
 router = APIRouter(tags=["questions"])
@@ -26,6 +28,8 @@ def create_question(question_data: QuestionSchema, db: Session = Depends(get_db)
     db.add(question)
     db.commit()
     db.refresh(question)
+    answer_keys.invalidate(question.exam_id)
+    exam_snapshots.invalidate(question.exam_id)
     return question
 
 @router.put("/questions/{question_id}", response_model=QuestionSchema)
@@ -37,11 +41,16 @@ def update_question(question_id: int, question_data: QuestionSchema, db: Session
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
 
+    previous_exam_id = question.exam_id
     for key, value in question_data.dict().items():
         setattr(question, key, value)
 
     db.commit()
     db.refresh(question)
+    answer_keys.invalidate(previous_exam_id)
+    exam_snapshots.invalidate(previous_exam_id)
+    answer_keys.invalidate(question.exam_id)
+    exam_snapshots.invalidate(question.exam_id)
     return question
 
 @router.delete("/questions/{question_id}", status_code=204)
@@ -53,6 +62,9 @@ def delete_question(question_id: int, db: Session = Depends(get_db), current_use
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
 
+    exam_id = question.exam_id
     db.delete(question)
     db.commit()
+    answer_keys.invalidate(exam_id)
+    exam_snapshots.invalidate(exam_id)
     return {"ok": True}
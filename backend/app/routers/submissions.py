@@ -1,17 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException
+import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from app.core.database import get_db
+from app.core.export import export_response
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, select_columns
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.exam import Submission
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(tags=["submissions"])
 
+SUBMISSION_FIELDS = ["id", "user_id", "exam_id", "session_id", "answers", "score", "submitted_at", "duration_seconds"]
+
+def filter_submissions(query, exam_id, user_id, since, until):
+    if exam_id is not None:
+        query = query.filter(Submission.exam_id == exam_id)
+    if user_id is not None:
+        query = query.filter(Submission.user_id == user_id)
+    if since is not None:
+        query = query.filter(Submission.submitted_at >= since)
+    if until is not None:
+        query = query.filter(Submission.submitted_at < until)
+    return query
+
 @router.get("/submissions/admin/all")
-def get_all_submissions(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_all_submissions(
+    response: Response,
+    exam_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Returns one page of submissions, newest first, paged by X-Next-Cursor.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    columns = select_columns(Submission, fields, SUBMISSION_FIELDS)
+    query = filter_submissions(db.query(Submission), exam_id, user_id, since, until)
+    return keyset_page(query, columns, Submission.submitted_at, Submission.id, cursor, limit, response)
+
+@router.get("/submissions/admin/export")
+def export_submissions(
+    exam_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    fields: Optional[str] = None,
+    format: str = "ndjson",
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Streams every matching submission as NDJSON or CSV, in id order.
+    """
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    submissions = db.query(Submission).all()
-    return submissions
+    columns = select_columns(Submission, fields, SUBMISSION_FIELDS)
+    query = filter_submissions(db.query(Submission), exam_id, user_id, since, until)
+    return export_response(db, query.order_by(Submission.id), columns, format, gzip, "submissions")
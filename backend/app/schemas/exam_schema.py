@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class QuestionSchema(BaseModel):
     text: str
@@ -53,3 +53,9 @@ class ExamUpdateSchema(BaseModel):
 
 class AssignmentSchema(BaseModel):
     user_id: int
+
+class BulkAssignmentSchema(BaseModel):
+    # Candidates to assign; every candidate when omitted
+    user_ids: Optional[List[int]] = None
+    # Only candidates without a submission for the exam
+    not_submitted: bool = False
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+import numpy as np
+from typing import Dict
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.exam import Question
+
+class AnswerKey:
+    """
+    Compiled grading key for one exam: question ids in ascending order with
+    the correct option and marks of each question in parallel arrays.
+    """
+
+    def __init__(self, question_ids, correct_options, marks):
+        order = np.argsort(np.asarray(question_ids, dtype=np.int64), kind="stable")
+        self.question_ids = np.asarray(question_ids, dtype=np.int64)[order]
+        self.correct_options = np.asarray(correct_options, dtype=str)[order]
+        self.marks = np.asarray(marks, dtype=np.int64)[order]
+
+    @classmethod
+    def compile(cls, db: Session, exam_id: int) -> "AnswerKey":
+        rows = db.query(Question.id, Question.correct_option, Question.marks).filter(Question.exam_id == exam_id).all()
+        return cls([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows])
+
+    def grade(self, answers: Dict[int, str]) -> int:
+        """
+        Returns the total marks for the given {question_id: option} answers.
+        Answers to questions outside this exam score nothing.
+        """
+        if not answers or self.question_ids.size == 0:
+            return 0
+        ids = np.fromiter(answers.keys(), dtype=np.int64, count=len(answers))
+        given = np.array(list(answers.values()), dtype=str)
+        positions = np.minimum(np.searchsorted(self.question_ids, ids), self.question_ids.size - 1)
+        correct = (self.question_ids[positions] == ids) & (self.correct_options[positions] == given)
+        return int(self.marks[positions][correct].sum())
+
+class AnswerKeyCache:
+    """
+    Per-process cache of compiled answer keys keyed by exam id.
+
+    Concurrent misses for the same exam share one compile, so a mass submit
+    reads the exam's questions once per worker. When an entry expires, the
+    request that notices starts the recompile and the others keep grading
+    against the expiring key until it lands. Edits through this API
+    invalidate the entry; the TTL bounds how long other workers can keep
+    grading against a key that was edited elsewhere.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._keys = {}
+        self._compiling = {}
+        # Bumped on invalidation so a compile that raced an edit is not cached
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    async def get(self, exam_id: int, load_key):
+        """
+        Returns the exam's answer key, awaiting load_key() on a miss.
+        Returns None if load_key() returns None.
+        """
+        with self._lock:
+            entry = self._keys.get(exam_id)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            compiling = self._compiling.get(exam_id)
+            if compiling is None:
+                compiling = asyncio.ensure_future(self._load(exam_id, load_key, self._generations.get(exam_id, 0)))
+                self._compiling[exam_id] = compiling
+            elif entry is not None:
+                return entry[0]
+        return await asyncio.shield(compiling)
+
+    async def _load(self, exam_id: int, load_key, generation: int):
+        try:
+            answer_key = await load_key()
+            with self._lock:
+                if answer_key is not None and self._generations.get(exam_id, 0) == generation:
+                    self._keys[exam_id] = (answer_key, time.monotonic() + self.ttl_seconds)
+            return answer_key
+        finally:
+            with self._lock:
+                if self._compiling.get(exam_id) is asyncio.current_task():
+                    del self._compiling[exam_id]
+
+    def compile(self, db: Session, exam_id: int) -> AnswerKey:
+        answer_key = AnswerKey.compile(db, exam_id)
+        with self._lock:
+            self._keys[exam_id] = (answer_key, time.monotonic() + self.ttl_seconds)
+        return answer_key
+
+    def invalidate(self, exam_id: int):
+        with self._lock:
+            self._keys.pop(exam_id, None)
+            self._compiling.pop(exam_id, None)
+            self._generations[exam_id] = self._generations.get(exam_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self._compiling.clear()
+            self._generations.clear()
+
+answer_keys = AnswerKeyCache(settings.answer_key_ttl_seconds)
@@ -0,0 +1,52 @@
+from typing import List, Optional
+from sqlalchemy import exists, func, literal, select, Integer
+from sqlalchemy.orm import Session
+from app.core.database import dialect_insert
+from app.models.assignment import ExamAssignment
+from app.models.exam import Submission
+from app.models.user import User
+
+# Ids bound per statement, well under SQLite's bound-parameter limit
+ASSIGN_CHUNK_SIZE = 5000
+
+def candidate_select(exam_id: int, not_submitted: bool):
+    """
+    SELECT of (user id, exam id) for every candidate, optionally only those
+    without a submission for the exam. Callers narrow it by user id.
+    """
+    exam_id_param = literal(exam_id, Integer)
+    query = select(User.id, exam_id_param).where(User.role == "user")
+    if not_submitted:
+        query = query.where(~exists().where(Submission.user_id == User.id, Submission.exam_id == exam_id_param))
+    return query
+
+def assign_candidates(db: Session, exam_id: int, user_ids: Optional[List[int]] = None, not_submitted: bool = False) -> dict:
+    """
+    Assigns the exam to the selected candidates with set-based
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING statements, one per chunk
+    of user ids (or a single one when no ids are given). Existing
+    assignments are skipped, not errors. Requested ids that match no
+    candidate, or are excluded by not_submitted, are listed as unmatched.
+    """
+    base = candidate_select(exam_id, not_submitted)
+    selects = [base] if user_ids is None else [
+        base.where(User.id.in_(user_ids[i:i + ASSIGN_CHUNK_SIZE]))
+        for i in range(0, len(user_ids), ASSIGN_CHUNK_SIZE)
+    ]
+
+    inserted, matched, matched_ids = 0, 0, set()
+    for query in selects:
+        if user_ids is None:
+            matched += db.execute(select(func.count()).select_from(query.subquery())).scalar()
+        else:
+            chunk_ids = db.execute(query.with_only_columns(User.id)).scalars().all()
+            matched_ids.update(chunk_ids)
+            matched += len(chunk_ids)
+        stmt = dialect_insert(db, ExamAssignment).from_select(["user_id", "exam_id"], query)
+        inserted += db.execute(stmt.on_conflict_do_nothing(index_elements=["user_id", "exam_id"])).rowcount
+    db.commit()
+
+    report = {"inserted": inserted, "skipped": matched - inserted}
+    if user_ids is not None:
+        report["unmatched_user_ids"] = sorted(set(user_ids) - matched_ids)
+    return report
@@ -0,0 +1,67 @@
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Union
+from app.core.config import settings
+
+def normalize_embedding(embedding) -> np.ndarray:
+    """
+    Returns the embedding as a contiguous, L2-normalized float32 vector.
+    """
+    vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+class BaselineCache:
+    """
+    LRU cache of baseline face embeddings keyed by user id, with a TTL so
+    that rows changed behind the API's back are eventually picked up.
+
+    Vectors are stored pre-normalized and read-only, so the per-frame path
+    needs neither a DB read nor a list-to-array conversion on a hit.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Union[np.ndarray, None]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user_id: int, embedding) -> np.ndarray:
+        vector = normalize_embedding(embedding)
+        vector.flags.writeable = False
+        with self._lock:
+            self._entries[user_id] = (vector, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vector
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+baseline_cache = BaselineCache(settings.baseline_cache_size, settings.baseline_cache_ttl_seconds)
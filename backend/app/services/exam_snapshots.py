@@ -0,0 +1,82 @@
+import asyncio
+import gzip
+import hashlib
+import threading
+import time
+from app.core.config import settings
+
+class ExamSnapshot:
+    """
+    An exam's encoded GET /exams/{id} body, its gzip-compressed form and a
+    strong ETag derived from the body, so every worker computes the same tag.
+    """
+
+    def __init__(self, body: bytes, compress: bool):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6) if compress else None
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+class ExamSnapshotCache:
+    """
+    Per-process cache of exam snapshots keyed by exam id.
+
+    Concurrent misses for the same exam share one load, so an exam opening
+    to thousands of candidates costs one query and one serialization per
+    worker. Edits through this API invalidate the entry; the TTL bounds
+    staleness for edits made on other workers.
+    """
+
+    def __init__(self, ttl_seconds: float, compress: bool):
+        self.ttl_seconds = ttl_seconds
+        self.compress = compress
+        self._snapshots = {}
+        self._loading = {}
+        # Bumped on invalidation so a load that raced an edit is not cached
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    async def get(self, exam_id: int, load_body):
+        """
+        Returns the exam's snapshot, awaiting load_body() for its encoded
+        body on a miss. Returns None if load_body() returns None.
+        """
+        with self._lock:
+            entry = self._snapshots.get(exam_id)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            loading = self._loading.get(exam_id)
+            if loading is None:
+                loading = asyncio.ensure_future(self._load(exam_id, load_body, self._generations.get(exam_id, 0)))
+                self._loading[exam_id] = loading
+        return await asyncio.shield(loading)
+
+    async def _load(self, exam_id: int, load_body, generation: int):
+        try:
+            body = await load_body()
+            snapshot = ExamSnapshot(body, self.compress) if body is not None else None
+            with self._lock:
+                if snapshot is not None and self._generations.get(exam_id, 0) == generation:
+                    self._snapshots[exam_id] = (snapshot, time.monotonic() + self.ttl_seconds)
+            return snapshot
+        finally:
+            with self._lock:
+                if self._loading.get(exam_id) is asyncio.current_task():
+                    del self._loading[exam_id]
+
+    def invalidate(self, exam_id: int):
+        with self._lock:
+            self._snapshots.pop(exam_id, None)
+            self._loading.pop(exam_id, None)
+            self._generations[exam_id] = self._generations.get(exam_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+            self._loading.clear()
+            self._generations.clear()
+
+exam_snapshots = ExamSnapshotCache(settings.exam_snapshot_ttl_seconds, settings.exam_snapshot_gzip)
@@ -0,0 +1,243 @@
+import os
+import threading
+import numpy as np
+from typing import List, Optional, Tuple
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.proctor import UserFace
+from app.services.baseline_cache import normalize_embedding
+
+# How far below the newest indexed face id sync() keeps looking for rows
+# whose id was allocated earlier but committed later
+SYNC_GAP_WINDOW = 1000
+
+class FaceIndex:
+    """
+    In-memory index of every user's baseline face, used to catch one person
+    registering as several candidates.
+
+    Embeddings live as L2-normalized rows of a single float32 matrix, so a
+    nearest-neighbour query is one matrix-vector product over all users.
+    Rows are added or replaced in place and removed by moving the last row
+    into the hole, so the matrix stays dense.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.initial_capacity = initial_capacity
+        self.last_face_id = 0
+        # Ids below last_face_id that were not committed when last synced
+        self._gap_ids = set()
+        self._matrix = None
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self._rows = {}
+        self._size = 0
+        self._lock = threading.RLock()
+        # Serializes DB reads in sync() without blocking queries
+        self._sync_lock = threading.Lock()
+        # Set once the index holds every face registered before startup
+        self.ready = threading.Event()
+        # Faces registered before the index was ready, checked once it is
+        self._unchecked_face_ids = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, user_id: int, embedding):
+        vector = normalize_embedding(embedding)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.initial_capacity, vector.shape[0]), dtype=np.float32)
+                self._user_ids = np.zeros(self.initial_capacity, dtype=np.int64)
+            if vector.shape[0] != self._matrix.shape[1]:
+                raise ValueError(f"Embedding has {vector.shape[0]} dimensions, index has {self._matrix.shape[1]}")
+
+            row = self._rows.get(user_id)
+            if row is None:
+                if self._size == self._matrix.shape[0]:
+                    self._grow()
+                row = self._size
+                self._size += 1
+                self._rows[user_id] = row
+                self._user_ids[row] = user_id
+            self._matrix[row] = vector
+
+    def remove(self, user_id: int):
+        with self._lock:
+            row = self._rows.pop(user_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._user_ids[row] = self._user_ids[last]
+                self._rows[int(self._user_ids[row])] = row
+            self._size = last
+
+    def query(self, embedding, k: int = 1, exclude_user_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (user_id, distance) pairs, nearest first. Distances
+        are Euclidean between normalized embeddings, the same scale as
+        face_match_threshold.
+        """
+        vector = normalize_embedding(embedding)
+        with self._lock:
+            if self._size == 0:
+                return []
+            similarities = self._matrix[:self._size] @ vector
+            if exclude_user_id is not None and exclude_user_id in self._rows:
+                similarities[self._rows[exclude_user_id]] = -np.inf
+            k = min(k, self._size)
+            nearest = np.argpartition(-similarities, k - 1)[:k]
+            nearest = nearest[np.argsort(-similarities[nearest])]
+            user_ids = self._user_ids[nearest]
+
+        return [
+            (int(user_id), float(np.sqrt(max(0.0, 2.0 - 2.0 * similarities[row]))))
+            for user_id, row in zip(user_ids, nearest)
+            if np.isfinite(similarities[row])
+        ]
+
+    def sync(self, db: Session, batch_size: int = 1000):
+        """
+        Adds every UserFace row newer than the last one seen, picking up
+        registrations made by other workers. Queries keep running while the
+        rows are read; only each insert takes the index lock.
+
+        Concurrent registrations can commit out of id order, so ids skipped
+        below the newest one are remembered and looked up again on later
+        syncs, for up to SYNC_GAP_WINDOW ids.
+        """
+        with self._sync_lock:
+            newer = UserFace.id > self.last_face_id
+            rows = db.query(
+                UserFace.id, UserFace.user_id, UserFace.embedding, UserFace.embedding_vector
+            ).filter(or_(newer, UserFace.id.in_(sorted(self._gap_ids))) if self._gap_ids else newer)
+            for face_id, user_id, embedding, embedding_vector in rows.order_by(UserFace.id).yield_per(batch_size):
+                vector = embedding if embedding is not None else embedding_vector
+                if vector is not None:
+                    self.add(user_id, vector)
+                if face_id > self.last_face_id:
+                    self._gap_ids.update(range(max(self.last_face_id + 1, face_id - SYNC_GAP_WINDOW), face_id))
+                    self.last_face_id = face_id
+                else:
+                    self._gap_ids.discard(face_id)
+            self._gap_ids = {face_id for face_id in self._gap_ids if face_id > self.last_face_id - SYNC_GAP_WINDOW}
+
+    def build(self, session_factory):
+        """
+        Loads every registered face, marks the index ready, then checks the
+        registrations that arrived while it was loading. Run at startup,
+        off the request path; the first build reads every embedding.
+        """
+        db = session_factory()
+        try:
+            self.sync(db)
+            with self._lock:
+                self.ready.set()
+                unchecked, self._unchecked_face_ids = self._unchecked_face_ids, []
+            for face_id in unchecked:
+                check_registration(db, face_id)
+        except Exception as e:
+            print(f"Error building face index: {e}")
+        finally:
+            db.close()
+
+    def start_build(self, session_factory):
+        threading.Thread(target=self.build, args=(session_factory,), name="face-index-build", daemon=True).start()
+
+    def defer_check(self, face_id: int) -> bool:
+        """
+        Queues a registration's duplicate check for when the index is ready.
+        Returns False if the index is already ready.
+        """
+        with self._lock:
+            if self.ready.is_set():
+                return False
+            self._unchecked_face_ids.append(face_id)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.last_face_id = 0
+            self._gap_ids = set()
+            self._matrix = None
+            self._user_ids = np.empty(0, dtype=np.int64)
+            self._rows = {}
+            self._size = 0
+            self.ready.clear()
+            self._unchecked_face_ids = []
+
+    def save(self, path: str):
+        with self._lock:
+            if self._matrix is None:
+                return
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    matrix=self._matrix[:self._size],
+                    user_ids=self._user_ids[:self._size],
+                    last_face_id=np.int64(self.last_face_id),
+                    gap_ids=np.array(sorted(self._gap_ids), dtype=np.int64),
+                )
+            os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as snapshot:
+            matrix = snapshot["matrix"].astype(np.float32)
+            user_ids = snapshot["user_ids"].astype(np.int64)
+            last_face_id = int(snapshot["last_face_id"])
+            gap_ids = {int(face_id) for face_id in snapshot["gap_ids"]} if "gap_ids" in snapshot.files else set()
+        with self._lock:
+            capacity = max(self.initial_capacity, matrix.shape[0])
+            self._matrix = np.zeros((capacity, matrix.shape[1]), dtype=np.float32)
+            self._matrix[:matrix.shape[0]] = matrix
+            self._user_ids = np.zeros(capacity, dtype=np.int64)
+            self._user_ids[:user_ids.shape[0]] = user_ids
+            self._rows = {int(user_id): row for row, user_id in enumerate(user_ids)}
+            self._size = matrix.shape[0]
+            self.last_face_id = last_face_id
+            self._gap_ids = gap_ids
+        return True
+
+    def _grow(self):
+        capacity = self._matrix.shape[0] * 2
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        user_ids = np.zeros(capacity, dtype=np.int64)
+        user_ids[:self._size] = self._user_ids[:self._size]
+        self._matrix, self._user_ids = matrix, user_ids
+
+face_index = FaceIndex()
+
+def find_duplicate_identity(db: Session, user_id: int, embedding) -> Optional[int]:
+    """
+    Returns the id of another user whose registered face matches this
+    embedding within duplicate_face_threshold, or None. The index must be
+    ready; only registrations newer than it are read here.
+    """
+    face_index.sync(db)
+    matches = face_index.query(embedding, k=1, exclude_user_id=user_id)
+    if matches and matches[0][1] < settings.duplicate_face_threshold:
+        return matches[0][0]
+    return None
+
+def check_registration(db: Session, face_id: int):
+    """
+    Runs the duplicate check for a stored UserFace row, records the match
+    on it and adds the face to the index.
+    """
+    user_face = db.query(UserFace).filter(UserFace.id == face_id).first()
+    if user_face is None or user_face.embedding is None:
+        return
+    duplicate_of_user_id = find_duplicate_identity(db, user_face.user_id, user_face.embedding)
+    # Added here rather than left to sync(), which only sees it once every
+    # lower id has been committed or has left the gap window
+    face_index.add(user_face.user_id, user_face.embedding)
+    if duplicate_of_user_id is not None:
+        print(f"User {user_face.user_id} registered a face matching user {duplicate_of_user_id}")
+        user_face.duplicate_of_user_id = duplicate_of_user_id
+        db.commit()
@@ -0,0 +1,57 @@
+import asyncio
+from app.core.config import settings
+
+class FrameIngestQueue:
+    """
+    Bounded queue of accepted frames, drained by a fixed number of consumer
+    tasks on the worker's event loop.
+
+    offer() never blocks: it returns False when max_queued jobs are already
+    waiting, so callers can reject the frame up front. Memory is bounded by
+    the queued jobs plus one in flight per consumer.
+    """
+
+    def __init__(self, max_queued: int, workers: int):
+        self.max_queued = max(1, max_queued)
+        self.workers = max(1, workers)
+        self._queue = None
+        self._loop = None
+        self._consumers = set()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._consumers = {loop.create_task(self._consume(self._queue)) for _ in range(self.workers)}
+
+    def offer(self, fn, *args) -> bool:
+        """
+        Queues the coroutine function call fn(*args). Returns False if full.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((fn, args))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def join(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _consume(self, queue: asyncio.Queue):
+        while True:
+            fn, args = await queue.get()
+            try:
+                await fn(*args)
+            except Exception as e:
+                print(f"Error processing queued frame: {e}")
+            finally:
+                queue.task_done()
+
+frame_ingest = FrameIngestQueue(settings.frame_ingest_max_queued, settings.frame_ingest_workers)
@@ -0,0 +1,151 @@
+import datetime
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+from sqlalchemy import exists, or_, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import LeaderLock
+from app.models.proctor import ProctorLog, UserFace
+
+# Log rows cleared per sweeper transaction
+SWEEP_BATCH_SIZE = 1000
+# Files stored or reused this recently are never swept: the row that will
+# refer to them may not be committed yet
+SWEEP_GRACE_SECONDS = 3600
+
+class FrameStore:
+    """
+    Content-addressed image storage. An image is stored once under its
+    SHA-256, in a two-level directory fan-out (ab/cd/abcd...jpg), so no
+    directory grows past a few thousand entries and identical uploads,
+    such as a frozen webcam, share one file.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path_for(self, digest: str, suffix: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / f"{digest}{suffix}"
+
+    def put(self, data: bytes, filename: str = "") -> str:
+        """
+        Stores data if not already present and returns its path. Reusing
+        a stored file refreshes its mtime, which keeps the sweeper off it
+        until the caller's row is committed.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, Path(filename or "").suffix.lower())
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return str(path)
+
+    def delete(self, path: str, unused_since: float = None) -> bool:
+        """
+        Removes a stored file. Paths outside the store are left alone, as
+        are files modified after unused_since (a Unix time) if given.
+        """
+        path = Path(path)
+        if self.root.resolve() not in path.resolve().parents:
+            return False
+        try:
+            if unused_since is not None and path.stat().st_mtime > unused_since:
+                return False
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+def is_referenced(db: Session, image_path: str) -> bool:
+    return db.query(or_(
+        exists().where(ProctorLog.image_path == image_path),
+        exists().where(UserFace.image_path == image_path),
+    )).scalar()
+
+def sweep_expired_frames(db: Session, store: FrameStore, retention_days: Dict[str, int], now=None) -> int:
+    """
+    Drops the images of log rows older than their event type's retention,
+    keeping the rows themselves. A file is deleted once no log row or
+    baseline face refers to it, since identical frames share one file.
+    Event types without a rule keep their images. Files stored or reused
+    within SWEEP_GRACE_SECONDS are kept too. Returns files deleted.
+    """
+    now = now or datetime.datetime.utcnow()
+    unused_since = time.time() - SWEEP_GRACE_SECONDS
+    deleted = 0
+    for event_type, days in retention_days.items():
+        cutoff = now - datetime.timedelta(days=days)
+        while True:
+            rows = db.query(ProctorLog.id, ProctorLog.image_path).filter(
+                ProctorLog.event_type == event_type,
+                ProctorLog.timestamp < cutoff,
+                ProctorLog.image_path.isnot(None),
+            ).limit(SWEEP_BATCH_SIZE).all()
+            if not rows:
+                break
+            db.execute(
+                update(ProctorLog).where(ProctorLog.id.in_([id for id, _ in rows])).values(image_path=None)
+            )
+            db.commit()
+            for image_path in {image_path for _, image_path in rows}:
+                if not is_referenced(db, image_path) and store.delete(image_path, unused_since):
+                    deleted += 1
+    return deleted
+
+class FrameSweeper:
+    """
+    Background thread that enforces frame_retention_days periodically. On
+    Postgres only the worker holding an advisory lock sweeps.
+    """
+
+    def __init__(self, store: FrameStore, retention_days: Dict[str, int], interval_seconds: float):
+        self.store = store
+        self.retention_days = retention_days
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+        self._leader = LeaderLock(4_815_162_344, "frame sweeper")
+
+    def start(self, session_factory):
+        if self.interval_seconds <= 0 or not self.retention_days or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(session_factory,), daemon=True)
+        self._thread.start()
+
+    def _run(self, session_factory):
+        engine = session_factory.kw["bind"]
+        while not self._stop.is_set():
+            if not self._leader.acquire(engine):
+                self._stop.wait(self.interval_seconds)
+                continue
+            db = session_factory()
+            try:
+                deleted = sweep_expired_frames(db, self.store, self.retention_days)
+                if deleted:
+                    print(f"Frame sweeper deleted {deleted} expired image(s)")
+            except Exception as e:
+                db.rollback()
+                print(f"Error sweeping expired frames: {e}")
+            finally:
+                db.close()
+            self._stop.wait(self.interval_seconds)
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+        self._leader.release()
+
+frame_store = FrameStore(settings.frame_storage_dir)
+frame_sweeper = FrameSweeper(frame_store, settings.frame_retention_days, settings.frame_sweep_interval_seconds)
@@ -0,0 +1,162 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+from app.core.config import settings
+from app.services import model_registry
+
+def _init_worker(preload: bool):
+    # A worker process runs one task at a time, so there is never a second
+    # crop to batch with; embed directly instead of waiting for one
+    from app.services.proctoring import embedding_batcher
+    embedding_batcher.max_batch_size = 1
+    if preload:
+        model_registry.load_models()
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference executor already has max_pending tasks."""
+
+class InferenceExecutor:
+    """
+    Runs face inference off the request path with a bounded backlog.
+
+    backend is one of:
+      - "inline": run in the calling thread
+      - "thread": a thread pool sharing this process's models
+      - "process": a process pool; each worker preloads its own models.
+        Workers are spawned rather than forked, since forking a process
+        with TensorFlow loaded and background threads running can
+        deadlock. If a worker dies (e.g. OOM-killed) the pool is replaced.
+
+    At most max_pending tasks may be queued or running. Further submissions
+    raise InferenceQueueFull immediately so callers can shed load instead
+    of adding latency for every candidate.
+    """
+
+    def __init__(self, backend: str, max_workers: int, max_pending: int):
+        if backend not in ("inline", "thread", "process"):
+            raise ValueError(f"Unknown inference backend: {backend}")
+        self.backend = backend
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self._pending = 0
+        self._pool = None
+        self._preload = False
+        self._warm_workers = []
+        self._lock = threading.Lock()
+
+    def start(self, preload: bool = True):
+        """
+        Creates the worker pool and, if preload is set, loads the models:
+        in this process for inline/thread, in every worker for process.
+        """
+        self._preload = preload
+        self._get_pool()
+        if preload and self.backend != "process":
+            threading.Thread(target=model_registry.load_models, daemon=True).start()
+
+    def is_ready(self) -> bool:
+        if self.backend == "process":
+            return bool(self._warm_workers) and all(
+                future.done() and future.exception() is None and future.result()
+                for future in self._warm_workers
+            )
+        return model_registry.is_ready()
+
+    def pending(self) -> int:
+        return self._pending
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise InferenceQueueFull()
+            self._pending += 1
+
+    def _release(self, *_):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn: Callable, *args) -> Future:
+        self._acquire()
+
+        if self.backend == "inline":
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._release()
+            return future
+
+        try:
+            if self.backend == "thread":
+                return self._get_pool().submit(self._call_and_release, fn, *args)
+            pool = self._get_pool()
+            try:
+                future = pool.submit(fn, *args)
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                pool = self._get_pool()
+                future = pool.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        # Worker processes cannot touch our counter; release when the result lands
+        future.add_done_callback(self._release)
+        future.add_done_callback(lambda done: self._discard_if_broken(pool, done))
+        return future
+
+    def _call_and_release(self, fn: Callable, *args):
+        # Release before the caller can observe the result, so a finished
+        # task never counts against the next submission.
+        try:
+            return fn(*args)
+        finally:
+            self._release()
+
+    def _discard_if_broken(self, pool, future: Future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard_pool(pool)
+
+    def _discard_pool(self, pool):
+        # The next submission starts a fresh pool
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _get_pool(self):
+        if self.backend == "inline" or self._pool is not None:
+            return self._pool
+        with self._lock:
+            if self._pool is None:
+                if self.backend == "process":
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self._preload,),
+                    )
+                    if self._preload:
+                        # Workers load their models in the initializer; one no-op
+                        # task per worker spawns them and reports when they are warm.
+                        self._warm_workers = [
+                            self._pool.submit(model_registry.is_ready) for _ in range(self.max_workers)
+                        ]
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="inference"
+                    )
+        return self._pool
+
+inference_executor = InferenceExecutor(
+    settings.inference_backend, settings.inference_workers, settings.inference_max_pending
+)
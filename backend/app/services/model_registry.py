@@ -0,0 +1,74 @@
+import threading
+import numpy as np
+from deepface import DeepFace
+from app.core.config import settings
+
+# Models are built once per process and pinned here so that the first frame
+# of an exam window does not pay for a cold TensorFlow graph build.
+_models = {}
+_ready = threading.Event()
+_lock = threading.Lock()
+
+def load_models():
+    """
+    Builds the face detector and embedding model, then runs a warm-up
+    inference so the first real request sees steady-state latency.
+    Safe to call more than once; models are only built on the first call.
+    """
+    with _lock:
+        if _ready.is_set():
+            return
+        try:
+            _models["detector"] = DeepFace.build_model(
+                model_name=settings.face_detector_backend, task="face_detector"
+            )
+            _models["recognizer"] = DeepFace.build_model(
+                model_name=settings.face_model_name, task="facial_recognition"
+            )
+            warm_up()
+            _ready.set()
+        except Exception as e:
+            print(f"Error loading face models: {e}")
+
+def warm_up():
+    """
+    Runs detection and embedding once on a synthetic image so TensorFlow
+    traces its graphs before the first real frame arrives.
+    """
+    synthetic = np.zeros((224, 224, 3), dtype=np.uint8)
+    DeepFace.extract_faces(
+        img_path=synthetic,
+        detector_backend=settings.face_detector_backend,
+        enforce_detection=False,
+    )
+    DeepFace.represent(
+        img_path=synthetic,
+        model_name=settings.face_model_name,
+        detector_backend="skip",
+        enforce_detection=False,
+    )
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def get_detector():
+    """
+    Returns the pinned face detector, loading it on first use if the
+    startup preload has not finished (or was disabled).
+    """
+    if "detector" not in _models:
+        load_models()
+    return _models.get("detector") or DeepFace.build_model(
+        model_name=settings.face_detector_backend, task="face_detector"
+    )
+
+def get_recognizer():
+    """
+    Returns the pinned embedding model, loading it on first use if the
+    startup preload has not finished (or was disabled).
+    """
+    if "recognizer" not in _models:
+        load_models()
+    return _models.get("recognizer") or DeepFace.build_model(
+        model_name=settings.face_model_name, task="facial_recognition"
+    )
@@ -1,29 +1,261 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
 import cv2
 import numpy as np
-from deepface import DeepFace
+from deepface.models.Detector import FacialAreaRegion
+from deepface.modules import detection, preprocessing
 from app.core.config import settings
-from typing import Union
+from app.services import model_registry
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple, Union
 
-def analyze_face(image_path: str, baseline_embedding: list) -> str:
+# JPEG start-of-frame markers, which carry the image dimensions
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_REDUCED_READ_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Reads (width, height) from a JPEG's frame header without decoding it.
+    Returns None for anything that is not a well-formed JPEG.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in _SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+def decode_image(data: bytes, min_side: int = 0) -> Union[np.ndarray, None]:
+    """
+    Decodes encoded image bytes (JPEG, PNG, ...) into a BGR array.
+    Returns None if the bytes are not a decodable image.
+
+    With min_side set, a JPEG is decoded at the largest 1/2, 1/4 or 1/8
+    reduction that keeps its longest side at or above min_side. libjpeg
+    then skips most of the IDCT and colour conversion work.
+    """
+    if not data:
+        return None
+    flag = cv2.IMREAD_COLOR
+    size = jpeg_size(data) if min_side > 0 else None
+    if size:
+        for factor, reduced_flag in _REDUCED_READ_FLAGS:
+            if max(size) // factor >= min_side:
+                flag = reduced_flag
+                break
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+
+def _scale_point(point, factor: float):
+    return None if point is None else (int(point[0] * factor), int(point[1] * factor))
+
+def _scale_region(region: FacialAreaRegion, factor: float) -> FacialAreaRegion:
+    return FacialAreaRegion(
+        x=int(region.x * factor), y=int(region.y * factor),
+        w=int(region.w * factor), h=int(region.h * factor),
+        left_eye=_scale_point(region.left_eye, factor),
+        right_eye=_scale_point(region.right_eye, factor),
+        confidence=region.confidence,
+    )
+
+def _align_face(img: np.ndarray, region: FacialAreaRegion) -> np.ndarray:
+    """
+    Crops the face in region from img, rotated so the eyes are level.
+
+    Only a window centered on the face is rotated, padded with black where
+    it runs past the frame, so alignment costs the same at any resolution.
+    The margin keeps the rotated box inside the window, as the border that
+    DeepFace adds around the whole image does.
+    """
+    x, y, w, h = region.x, region.y, region.w, region.h
+    if region.left_eye is None or region.right_eye is None:
+        return img[max(y, 0):y + h, max(x, 0):x + w]
+
+    m = max(w, h) // 2 + 1
+    x1, y1, x2, y2 = x - m, y - m, x + w + m, y + h + m
+    window = img[max(y1, 0):min(y2, img.shape[0]), max(x1, 0):min(x2, img.shape[1])]
+    window = cv2.copyMakeBorder(
+        window,
+        max(-y1, 0), max(y2 - img.shape[0], 0), max(-x1, 0), max(x2 - img.shape[1], 0),
+        cv2.BORDER_CONSTANT, value=[0, 0, 0],
+    )
+    aligned, angle = detection.align_img_wrt_eyes(
+        img=window,
+        left_eye=(region.left_eye[0] - x1, region.left_eye[1] - y1),
+        right_eye=(region.right_eye[0] - x1, region.right_eye[1] - y1),
+    )
+    ax1, ay1, ax2, ay2 = detection.project_facial_area(
+        facial_area=(m, m, m + w, m + h), angle=angle, size=(window.shape[0], window.shape[1])
+    )
+    return aligned[int(ay1):int(ay2), int(ax1):int(ax2)]
+
+def detect_faces(img: np.ndarray) -> List[np.ndarray]:
+    """
+    Runs the detector once and returns the aligned face crops as RGB
+    arrays in [0, 1], like DeepFace.extract_faces.
+
+    Detection runs on a copy shrunk to face_detector_input_size on its
+    longest side, so its cost does not grow with the frame resolution.
+    The boxes and landmarks are then scaled back, and each face is cropped
+    and aligned from img itself at full detail.
+    """
+    small, scale = img, 1.0
+    input_size = settings.face_detector_input_size
+    if input_size > 0 and max(img.shape[:2]) > input_size:
+        scale = input_size / max(img.shape[:2])
+        small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    faces = []
+    for region in model_registry.get_detector().detect_faces(small):
+        face = _align_face(img, _scale_region(region, 1 / scale))
+        if face.shape[0] and face.shape[1]:
+            faces.append(face[:, :, ::-1] / 255)
+    return faces
+
+def _prepare_face(face: np.ndarray, target_size: tuple) -> np.ndarray:
+    # extract_faces returns RGB crops; the recognition models expect BGR
+    face = preprocessing.resize_image(img=face[:, :, ::-1], target_size=(target_size[1], target_size[0]))
+    return preprocessing.normalize_input(img=face, normalization="base")
+
+def embed_faces(faces: List[np.ndarray]) -> np.ndarray:
+    """
+    Computes embeddings for a list of aligned face crops from detect_faces
+    in a single batched forward pass. Returns an (N, D) float32 array of
+    L2-normalized rows.
+    """
+    recognizer = model_registry.get_recognizer()
+    batch = np.concatenate([_prepare_face(face, recognizer.input_shape) for face in faces], axis=0)
+    # Call the Keras model directly: FacialRecognition.forward only handles
+    # a batch of one. Rows are L2-normalized as DeepFace does for VGG-Face,
+    # so baselines and frame embeddings are always on the same scale.
+    embeddings = np.asarray(recognizer.model(batch, training=False), dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+class EmbeddingBatcher:
+    """
+    Collects face crops from concurrent requests and embeds them together.
+
+    A background thread waits for the first crop, then keeps collecting
+    until max_batch_size crops are queued or max_wait_ms has passed, runs
+    one batched embedding call and resolves each caller's future with its
+    own row. It only waits for crops from callers already inside embed(),
+    so a lone frame is embedded at once.
+
+    A batch can never be larger than the number of threads calling embed()
+    at once, which for the thread backend is inference_workers. Process
+    workers run one task at a time and bypass the batcher entirely.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, embed_fn: Callable = embed_faces):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.embed_fn = embed_fn
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Callers inside embed(), whose crops are queued or about to be
+        self._in_flight = 0
+
+    def submit(self, face: np.ndarray) -> Future:
+        future = Future()
+        self._ensure_started()
+        self._queue.put((face, future))
+        return future
+
+    def embed(self, face: np.ndarray) -> np.ndarray:
+        if self.max_batch_size == 1:
+            return self.embed_fn([face])[0]
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return self.submit(face).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        # Wait only for callers that are already on their way
+        while len(batch) < min(self.max_batch_size, max(self._in_flight, self._queue.qsize() + len(batch))):
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                embeddings = self.embed_fn([face for face, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+embedding_batcher = EmbeddingBatcher(settings.embedding_batch_max_size, settings.embedding_batch_max_wait_ms)
+
+def embed_face(face: np.ndarray) -> np.ndarray:
+    """
+    Computes the embedding of an aligned face crop from detect_faces
+    without running detection again. Concurrent calls are micro-batched.
     """
-    Analyzes a face from an image, compares it with a baseline embedding,
-    and returns the event type.
+    return embedding_batcher.embed(face)
+
+def analyze_face(img: np.ndarray, baseline_embedding: np.ndarray, timings: Optional[dict] = None) -> str:
+    """
+    Analyzes a face from a decoded BGR image, compares it with a baseline
+    embedding, and returns the event type. If a timings dict is given, the
+    duration of each stage is recorded in it in milliseconds.
     """
+    if timings is None:
+        timings = {}
     try:
-        # Face detection using Mediapipe
-        face_objs = DeepFace.extract_faces(img_path=image_path, detector_backend='mediapipe', enforce_detection=False)
+        started = time.perf_counter()
+        faces = detect_faces(img)
+        timings["detect"] = (time.perf_counter() - started) * 1000
 
-        if not face_objs:
+        if not faces:
             return "no_face"
 
-        if len(face_objs) > 1:
+        if len(faces) > 1:
             return "multi_face"
 
-        # Generate embedding for the detected face
-        current_embedding = DeepFace.represent(img_path=image_path, model_name='VGG-Face', enforce_detection=False)[0]['embedding']
+        # Embed the crop from the detection pass instead of detecting again
+        started = time.perf_counter()
+        current_embedding = embed_face(faces[0])
+        timings["embed"] = (time.perf_counter() - started) * 1000
 
         # Compare with the baseline embedding
-        distance = np.linalg.norm(np.array(current_embedding) - np.array(baseline_embedding))
+        started = time.perf_counter()
+        distance = np.linalg.norm(current_embedding - np.asarray(baseline_embedding, dtype=np.float32))
+        timings["compare"] = (time.perf_counter() - started) * 1000
 
         if distance < settings.face_match_threshold:
             return "face_match"
@@ -34,13 +266,107 @@ def analyze_face(image_path: str, baseline_embedding: list) -> str:
         print(f"Error during face analysis: {e}")
         return "error"
 
-def generate_embedding(image_path: str) -> Union[list, None]:
+def analyze_frame(data: bytes, baseline_embedding: np.ndarray) -> Tuple[str, dict]:
+    """
+    Decodes an uploaded frame and analyzes it. Returns the event type and
+    the per-stage timings in milliseconds, decode included. Takes and
+    returns plain values so it can run in an inference worker process.
+    """
+    timings = {}
+    started = time.perf_counter()
+    img = decode_image(data, settings.frame_decode_min_side)
+    timings["decode"] = (time.perf_counter() - started) * 1000
+    if img is None:
+        return "error", timings
+    return analyze_face(img, baseline_embedding, timings), timings
+
+def generate_embedding(img: np.ndarray) -> Union[list, None]:
     """
-    Generates a face embedding from an image.
+    Generates a face embedding from a decoded BGR image.
     """
     try:
-        embedding = DeepFace.represent(img_path=image_path, model_name='VGG-Face', enforce_detection=True)[0]['embedding']
-        return embedding
+        faces = detect_faces(img)
+        if not faces:
+            return None
+        return embed_face(faces[0]).tolist()
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return None
+
+def embedding_from_bytes(data: bytes) -> Union[list, None]:
+    """
+    Decodes an uploaded image and generates its face embedding.
+    """
+    img = decode_image(data, settings.frame_decode_min_side)
+    if img is None:
+        return None
+    return generate_embedding(img)
+
+# Verdicts that describe the candidate and may be reused for unchanged frames
+REUSABLE_EVENTS = ("no_face", "multi_face", "face_match", "mismatch")
+
+def frame_signature(data: bytes, size: int = 32) -> Union[np.ndarray, None]:
+    """
+    Computes a cheap thumbnail of an encoded frame for change detection.
+    The JPEG is decoded at 1/8 scale in grayscale, which skips most of the
+    decode work, and shrunk to size x size.
+    """
+    if not data:
+        return None
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return None
+    return cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+class FrameGate:
+    """
+    Per-session pre-filter that skips inference for frames that have not
+    meaningfully changed since the last analyzed frame of that session.
+
+    A frame is unchanged when the mean absolute difference between its
+    signature and the last analyzed one is below threshold (grey levels,
+    0-255). At most max_skips frames in a row reuse a verdict before the
+    next one is analyzed again. Only the max_sessions most recently seen
+    sessions are tracked.
+    """
+
+    def __init__(self, threshold: float, max_skips: int, max_sessions: int = 10000):
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key, signature: Optional[np.ndarray]) -> Optional[str]:
+        """
+        Returns the verdict to reuse for this frame, or None if it has to be
+        analyzed.
+        """
+        if signature is None or self.threshold <= 0 or self.max_skips <= 0:
+            return None
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is None:
+                return None
+            self._sessions.move_to_end(key)
+            if state["skips"] >= self.max_skips:
+                return None
+            if float(np.mean(np.abs(signature - state["signature"]))) >= self.threshold:
+                return None
+            state["skips"] += 1
+            return state["event"]
+
+    def update(self, key, signature: Optional[np.ndarray], event_type: str):
+        """
+        Records the verdict of an analyzed frame as the new reference.
+        """
+        with self._lock:
+            if signature is None or event_type not in REUSABLE_EVENTS:
+                self._sessions.pop(key, None)
+                return
+            self._sessions[key] = {"signature": signature, "event": event_type, "skips": 0}
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+frame_gate = FrameGate(settings.frame_gate_threshold, settings.frame_gate_max_skips)
@@ -0,0 +1,92 @@
+import codecs
+import csv
+import json
+from typing import BinaryIO, Iterator, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.exam import Question
+from app.schemas.exam_schema import QuestionSchema
+
+# Errors beyond this many are counted but not itemized in the report
+MAX_REPORTED_ERRORS = 1000
+
+def read_jsonl(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    for line_number, line in enumerate(codecs.iterdecode(stream, "utf-8"), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, e
+
+def read_csv(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    """
+    Reads text, correct_option and marks columns, plus either an options
+    column holding a JSON object or one option_<key> column per option.
+    """
+    reader = csv.DictReader(codecs.iterdecode(stream, "utf-8"))
+    for row in reader:
+        # Header is line 1; data rows start at line 2
+        line_number = reader.line_num
+        options = {key[len("option_"):]: value for key, value in row.items() if key and key.startswith("option_") and value}
+        try:
+            if row.get("options"):
+                options = json.loads(row["options"])
+        except json.JSONDecodeError as e:
+            yield line_number, e
+            continue
+        yield line_number, {
+            "text": row.get("text"),
+            "options": options,
+            "correct_option": row.get("correct_option"),
+            "marks": row.get("marks"),
+        }
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv}
+
+def validate_row(row) -> Tuple[QuestionSchema, list]:
+    if isinstance(row, Exception):
+        return None, [str(row)]
+    if not isinstance(row, dict):
+        return None, ["Expected a JSON object"]
+    try:
+        question = QuestionSchema(**row)
+    except ValidationError as e:
+        return None, [f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()]
+    if question.correct_option not in question.options:
+        return None, [f"correct_option: '{question.correct_option}' is not one of the options"]
+    return question, []
+
+def import_questions(db: Session, exam_id: int, stream: BinaryIO, format: str) -> dict:
+    """
+    Validates questions from a JSON-lines or CSV stream row by row and
+    inserts the valid ones into exam_id with multi-row INSERTs of
+    question_import_chunk_size rows. Only one chunk is held in memory at a
+    time. All valid rows commit together; invalid rows are reported by
+    line number and skipped.
+    """
+    chunk, imported, failed, errors = [], 0, 0, []
+
+    def flush():
+        nonlocal imported
+        if chunk:
+            db.execute(insert(Question), chunk)
+            imported += len(chunk)
+            chunk.clear()
+
+    for line_number, row in READERS[format](stream):
+        question, row_errors = validate_row(row)
+        if row_errors:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line_number, "errors": row_errors})
+            continue
+        chunk.append({"exam_id": exam_id, **question.dict()})
+        if len(chunk) >= settings.question_import_chunk_size:
+            flush()
+    flush()
+    db.commit()
+
+    return {"imported": imported, "failed": failed, "errors": errors}
@@ -0,0 +1,134 @@
+import datetime
+import threading
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import LeaderLock, dialect_insert
+from app.models.exam import Exam
+from app.models.proctor import ProctorLog, SessionEventCount
+
+# Counters are kept per (exam, session, event type) only. A per-exam row
+# would be upserted by every candidate's frames and serialize them all on
+# its row lock; a session's row is only written by that session's frames.
+
+def record_event(db: Session, exam_id: int, session_id: str, event_type: str):
+    """
+    Adds one event to the session's rollup. Runs in the caller's
+    transaction, so the counter commits together with the ProctorLog row.
+    """
+    stmt = dialect_insert(db, SessionEventCount).values(
+        exam_id=exam_id, session_id=session_id, event_type=event_type, count=1
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["exam_id", "session_id", "event_type"],
+        set_={"count": SessionEventCount.count + stmt.excluded.count},
+    ))
+
+def exam_event_counts(db: Session, exam_id: int) -> dict:
+    """
+    Sums the exam's session rollups, one small row per session and event
+    type read through the (exam_id, session_id, event_type) unique index.
+    """
+    rows = db.query(SessionEventCount.event_type, func.sum(SessionEventCount.count)).filter(
+        SessionEventCount.exam_id == exam_id
+    ).group_by(SessionEventCount.event_type)
+    return {event: int(count) for event, count in rows}
+
+def session_event_counts(db: Session, exam_id: int, session_id: str) -> dict:
+    rows = db.query(SessionEventCount.event_type, SessionEventCount.count).filter(
+        SessionEventCount.exam_id == exam_id, SessionEventCount.session_id == session_id
+    )
+    return {event: count for event, count in rows}
+
+def rebuild_event_counts(db: Session, exam_id: int):
+    """
+    Recomputes an exam's rollups from its raw ProctorLog rows in one
+    transaction, correcting any drift in the running counters.
+
+    The exam's counter rows are locked first. A frame that already bumped
+    one has committed its log by the time the lock is granted, so the
+    recount includes it; one that has not waits and increments the
+    recounted value. Counts are upserted, so frames logged for new events
+    during the rebuild never collide with it on the unique constraint.
+    """
+    db.query(SessionEventCount.id).filter(SessionEventCount.exam_id == exam_id).with_for_update().all()
+    keys = [ProctorLog.exam_id, ProctorLog.session_id, ProctorLog.event_type]
+    stmt = dialect_insert(db, SessionEventCount).from_select(
+        ["exam_id", "session_id", "event_type", "count"],
+        select(*keys, func.count()).where(ProctorLog.exam_id == exam_id).group_by(*keys),
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["exam_id", "session_id", "event_type"],
+        set_={"count": stmt.excluded.count},
+    ))
+    # Drop counters whose events no longer appear in the logs
+    db.execute(delete(SessionEventCount).where(
+        SessionEventCount.exam_id == exam_id,
+        ~select(ProctorLog.id).where(
+            ProctorLog.exam_id == SessionEventCount.exam_id,
+            ProctorLog.session_id == SessionEventCount.session_id,
+            ProctorLog.event_type == SessionEventCount.event_type,
+        ).exists(),
+    ))
+    db.commit()
+
+def active_exam_ids(db: Session, since: datetime.datetime) -> list:
+    """
+    Returns the exams with ProctorLog rows at or after since. Probes the
+    (exam_id, timestamp) index once per exam instead of scanning the logs.
+    """
+    logged = select(ProctorLog.id).where(ProctorLog.exam_id == Exam.id, ProctorLog.timestamp >= since).exists()
+    return [exam_id for exam_id, in db.query(Exam.id).filter(logged)]
+
+def reconcile_recent(session_factory, since: datetime.datetime):
+    """
+    Rebuilds the rollups of every exam logged to since the given time, one
+    exam per transaction. Exams without new logs cannot have drifted.
+    """
+    db = session_factory()
+    try:
+        for exam_id in active_exam_ids(db, since):
+            try:
+                rebuild_event_counts(db, exam_id)
+            except Exception as e:
+                db.rollback()
+                print(f"Error reconciling rollups for exam {exam_id}: {e}")
+    finally:
+        db.close()
+
+class RollupReconciler:
+    """
+    Background thread that periodically rebuilds the rollups of exams with
+    recent activity from the raw logs. On Postgres only the worker holding
+    an advisory lock reconciles; the others retry each interval and take
+    over if that worker goes away.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+        self._leader = LeaderLock(4_815_162_343, "rollup reconciler")
+
+    def start(self, session_factory):
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(session_factory,), daemon=True)
+        self._thread.start()
+
+    def _run(self, session_factory):
+        engine = session_factory.kw["bind"]
+        while not self._stop.wait(self.interval_seconds):
+            if self._leader.acquire(engine):
+                # Look back two intervals so a pass that overran or was
+                # taken over from another worker still covers every log
+                since = datetime.datetime.utcnow() - datetime.timedelta(seconds=2 * self.interval_seconds)
+                reconcile_recent(session_factory, since)
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+        self._leader.release()
+
+rollup_reconciler = RollupReconciler(settings.rollup_reconcile_interval_seconds)
@@ -0,0 +1,64 @@
+"""
+Measures per-frame CPU time of decoding and face detection at common
+webcam resolutions, before and after resolution-aware preprocessing.
+
+    python -m scripts.benchmark_preprocessing [--image face.jpg] [--frames 20]
+
+"full" decodes the whole JPEG and runs DeepFace.extract_faces on it, as
+analyze_face used to. "reduced" uses decode_image with
+frame_decode_min_side and detect_faces with face_detector_input_size.
+Without --image a synthetic frame is used, which exercises the same
+decode and scan work but contains no face.
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+from deepface import DeepFace
+from app.core.config import settings
+from app.services import model_registry
+from app.services.proctoring import decode_image, detect_faces
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (2560, 1440), (3840, 2160)]
+
+def synthetic_frame(width: int, height: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    return cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+
+def full_pipeline(data: bytes) -> int:
+    img = decode_image(data)
+    faces = DeepFace.extract_faces(img_path=img, detector_backend=settings.face_detector_backend, enforce_detection=False)
+    return sum(1 for face in faces if face["confidence"] > 0)
+
+def reduced_pipeline(data: bytes) -> int:
+    return len(detect_faces(decode_image(data, settings.frame_decode_min_side)))
+
+def cpu_ms(fn, data: bytes, frames: int):
+    fn(data)
+    started = time.process_time()
+    for _ in range(frames):
+        found = fn(data)
+    return (time.process_time() - started) * 1000 / frames, found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="photo to scale to each resolution")
+    parser.add_argument("--frames", type=int, default=20)
+    args = parser.parse_args()
+
+    source = cv2.imread(args.image) if args.image else None
+    # Only the detector is needed; don't build the recognizer
+    model_registry._models["detector"] = DeepFace.build_model(model_name=settings.face_detector_backend, task="face_detector")
+
+    print(f"detector input {settings.face_detector_input_size}px, decode min side {settings.frame_decode_min_side}px")
+    print(f"{'resolution':>12} {'jpeg KB':>8} {'full ms':>9} {'reduced ms':>11} {'speedup':>8} {'faces':>6}")
+    for width, height in RESOLUTIONS:
+        frame = cv2.resize(source, (width, height)) if source is not None else synthetic_frame(width, height)
+        data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+        full, found_full = cpu_ms(full_pipeline, data, args.frames)
+        reduced, found_reduced = cpu_ms(reduced_pipeline, data, args.frames)
+        print(f"{width}x{height:<7} {len(data) // 1024:>8} {full:>9.1f} {reduced:>11.1f} {full / reduced:>7.1f}x {found_full:>3}/{found_reduced}")
+
+if __name__ == "__main__":
+    main()
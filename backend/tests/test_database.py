@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.core import database
+from app.core.config import settings
+from app.core.database import async_database_url, engine_options, run_db, run_in_new_session
+
+def test_engine_options_leave_sqlite_on_defaults(monkeypatch):
+    monkeypatch.setattr(settings, "db_statement_timeout_ms", 5000)
+    assert engine_options("sqlite:///./app.db") == {}
+    assert engine_options("sqlite+aiosqlite:///./app.db", is_async=True) == {}
+
+def test_engine_options_configure_postgres_pool_and_statement_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "db_pool_size", 7)
+    monkeypatch.setattr(settings, "db_max_overflow", 3)
+    monkeypatch.setattr(settings, "db_pool_timeout_seconds", 2.5)
+    monkeypatch.setattr(settings, "db_pool_recycle_seconds", 600)
+    monkeypatch.setattr(settings, "db_pool_pre_ping", True)
+    monkeypatch.setattr(settings, "db_statement_timeout_ms", 5000)
+
+    options = engine_options("postgresql://u:p@db/app")
+    assert options == {
+        "pool_size": 7,
+        "max_overflow": 3,
+        "pool_timeout": 2.5,
+        "pool_recycle": 600,
+        "pool_pre_ping": True,
+        "connect_args": {"options": "-c statement_timeout=5000"},
+    }
+    # asyncpg takes server settings instead of libpq options
+    options = engine_options("postgresql+asyncpg://u:p@db/app", is_async=True)
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+    assert options["pool_size"] == 7
+
+    monkeypatch.setattr(settings, "db_statement_timeout_ms", 0)
+    assert "connect_args" not in engine_options("postgresql://u:p@db/app")
+
+def test_async_database_url():
+    assert async_database_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+
+def test_run_db_falls_back_to_the_threadpool():
+    db = object()
+    seen = {}
+
+    def fn(session, value):
+        seen["session"] = session
+        seen["thread"] = threading.get_ident()
+        return value * 2
+
+    async def run():
+        seen["loop_thread"] = threading.get_ident()
+        return await run_db(db, None, fn, 21)
+
+    assert asyncio.run(run()) == 42
+    assert seen["session"] is db
+    assert seen["thread"] != seen["loop_thread"]
+
+def test_run_in_new_session_opens_and_closes_a_sync_session(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}")
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+    sessions = []
+
+    def fn(session, value):
+        sessions.append(session)
+        return session.execute(text("SELECT :value"), {"value": value}).scalar()
+
+    assert asyncio.run(run_in_new_session(fn, 5)) == 5
+    assert isinstance(sessions[0], Session)
+    assert not sessions[0].in_transaction()
+
+def test_run_in_new_session_uses_the_async_engine_when_enabled(tmp_path, monkeypatch):
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(async_engine))
+
+    def fn(session, value):
+        assert isinstance(session, Session)
+        return session.execute(text("SELECT :value"), {"value": value}).scalar()
+
+    async def run():
+        try:
+            return await run_in_new_session(fn, 9)
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(run()) == 9
@@ -1,11 +1,21 @@
+import asyncio
+import json
 import pytest
+from jose import jwt
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.core.database import Base, get_db
-from app.core.security import create_access_token, hash_password
+from app.core import security
+from app.core.security import create_access_token, create_user_access_token, hash_password, revoke_user_tokens, SECRET_KEY, ALGORITHM
 from app.models.user import User
+from app.services.answer_keys import AnswerKey, AnswerKeyCache, answer_keys
+from app.services.exam_snapshots import exam_snapshots
+from app.core import demo_exam
+from app.models.assignment import ExamAssignment
+from app.models.exam import Submission
+from app.core.config import settings
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -47,6 +57,9 @@ def client():
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
     Base.metadata.drop_all(bind=engine)
+    answer_keys.clear()
+    exam_snapshots.clear()
+    demo_exam._demo_exam_id = None
 
 @pytest.fixture(scope="module")
 def admin_token():
@@ -200,3 +213,281 @@ def test_delete_exam(client, admin_token):
     # Verify it's deleted
     get_response = client.get(f"/api/exams/{exam_id}", headers={"Authorization": f"Bearer {admin_token}"})
     assert get_response.status_code == 404
+
+def test_submit_exam_only_scores_questions_of_that_exam(client, user_token, admin_token):
+    exam_ids = []
+    for title in ("Graded Exam", "Other Exam"):
+        response = client.post(
+            "/api/exams",
+            headers={"Authorization": f"Bearer {admin_token}"},
+            json={
+                "title": title,
+                "description": "Scoring scope test.",
+                "duration_minutes": 15,
+                "questions": [
+                    {"text": "Pick A", "options": {"A": "a", "B": "b"}, "correct_option": "A", "marks": 3},
+                    {"text": "Pick B", "options": {"A": "a", "B": "b"}, "correct_option": "B", "marks": 4}
+                ]
+            }
+        )
+        exam_ids.append(response.json()["id"])
+
+    questions = {}
+    for exam_id in exam_ids:
+        detail = client.get(f"/api/exams/{exam_id}", headers={"Authorization": f"Bearer {admin_token}"}).json()
+        questions[exam_id] = [q["id"] for q in detail["questions"]]
+
+    graded, other = exam_ids
+    response = client.post(
+        "/api/exams/submit",
+        headers={"Authorization": f"Bearer {user_token}"},
+        json={
+            "exam_id": graded,
+            "answers": {
+                str(questions[graded][0]): "A",
+                str(questions[graded][1]): "A",
+                str(questions[other][1]): "B"
+            },
+            "duration_seconds": 60
+        }
+    )
+    assert response.status_code == 200
+    assert response.json()["score"] == 3
+
+def test_answer_key_grades_vectorized():
+    answer_key = AnswerKey([30, 10, 20], ["C", "A", "B"], [3, 1, 2])
+    assert answer_key.grade({10: "A", 20: "B", 30: "C"}) == 6
+    assert answer_key.grade({10: "AB", 20: "X", 99: "A"}) == 0
+    assert answer_key.grade({}) == 0
+    assert AnswerKey([], [], []).grade({1: "A"}) == 0
+
+def test_answer_key_cache_compiles_once_and_serves_stale_while_recompiling():
+    cache = AnswerKeyCache(ttl_seconds=60)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return AnswerKey([len(loads)], ["A"], [1])
+
+    async def run():
+        keys = await asyncio.gather(*[cache.get(1, load) for _ in range(100)])
+        assert len(loads) == 1 and all(key is keys[0] for key in keys)
+
+        # Expired: one request recompiles, the rest keep the old key
+        cache._keys[1] = (keys[0], 0)
+        first = asyncio.ensure_future(cache.get(1, load))
+        await asyncio.sleep(0)
+        assert await cache.get(1, load) is keys[0]
+        assert (await first).question_ids.tolist() == [2]
+        assert len(loads) == 2
+
+    asyncio.run(run())
+
+def test_question_edit_invalidates_cached_answer_key(client, user_token, admin_token):
+    exam_id = client.post(
+        "/api/exams",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "title": "Cached Key Exam",
+            "description": "Answer key invalidation.",
+            "duration_minutes": 15,
+            "questions": [{"text": "Pick A", "options": {"A": "a", "B": "b"}, "correct_option": "A", "marks": 5}]
+        }
+    ).json()["id"]
+    question_id = client.get(f"/api/exams/{exam_id}", headers={"Authorization": f"Bearer {admin_token}"}).json()["questions"][0]["id"]
+
+    def submit(answer):
+        return client.post(
+            "/api/exams/submit",
+            headers={"Authorization": f"Bearer {user_token}"},
+            json={"exam_id": exam_id, "answers": {str(question_id): answer}, "duration_seconds": 30}
+        ).json()["score"]
+
+    assert submit("A") == 5
+
+    response = client.put(
+        f"/api/questions/questions/{question_id}",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"text": "Pick B", "options": {"A": "a", "B": "b"}, "correct_option": "B", "marks": 7}
+    )
+    assert response.status_code == 200
+    assert submit("A") == 0
+    assert submit("B") == 7
+
+def test_claims_token_is_cached_and_revocation_is_durable(client, admin_token):
+    exam_id = client.post(
+        "/api/exams",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={"title": "Claims Exam", "description": "Stateless auth.", "duration_minutes": 5, "questions": []}
+    ).json()["id"]
+
+    db = TestingSessionLocal()
+    user = db.query(User).filter(User.email == "user@example.com").one()
+    token = create_user_access_token(user)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get(f"/api/exams/{exam_id}", headers=headers).status_code == 200
+
+    # Logging out bumps the stored token version; a worker that never saw
+    # the token, or one that restarted, rejects it too
+    assert client.post("/api/logout", headers=headers).status_code == 200
+    assert client.get(f"/api/exams/{exam_id}", headers=headers).status_code == 401
+    security._principal_cache.clear()
+    assert client.get(f"/api/exams/{exam_id}", headers=headers).status_code == 401
+
+    # A token issued right after the revocation, even within the same
+    # second, is accepted
+    db.refresh(user)
+    fresh = create_user_access_token(user)
+    assert client.get(f"/api/exams/{exam_id}", headers={"Authorization": f"Bearer {fresh}"}).status_code == 200
+    revoke_user_tokens(db, user.id)
+    assert client.get(f"/api/exams/{exam_id}", headers={"Authorization": f"Bearer {fresh}"}).status_code == 401
+    db.close()
+
+def test_login_issues_token_with_id_and_role_claims(client):
+    response = client.post("/api/login", data={"username": "user@example.com", "password": "user123"})
+    assert response.status_code == 200
+    claims = jwt.decode(response.json()["access_token"], SECRET_KEY, algorithms=[ALGORITHM])
+    assert claims["sub"] == "user@example.com"
+    assert claims["role"] == "user"
+    assert isinstance(claims["uid"], int)
+    assert claims["ver"] == 0
+
+def test_login_assigns_demo_exam_once_and_not_after_submission(client):
+    for _ in range(2):
+        response = client.post("/api/login", data={"username": "user@example.com", "password": "user123"})
+        assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    user_id = db.query(User.id).filter(User.email == "user@example.com").scalar()
+    admin_id = db.query(User.id).filter(User.email == "admin@example.com").scalar()
+    exam_id = demo_exam.get_demo_exam_id(db)
+    assert db.query(ExamAssignment).filter(ExamAssignment.user_id == user_id).count() == 1
+
+    db.add(Submission(user_id=admin_id, exam_id=exam_id, answers={}, score=0))
+    db.commit()
+    response = client.post("/api/login", data={"username": "admin@example.com", "password": "admin123"})
+    assert response.status_code == 200
+    assert db.query(ExamAssignment).filter(ExamAssignment.user_id == admin_id).count() == 0
+    db.close()
+
+def test_login_rejects_wrong_password(client):
+    response = client.post("/api/login", data={"username": "user@example.com", "password": "wrong"})
+    assert response.status_code == 401
+
+def test_bulk_import_questions_reports_bad_rows(client, admin_token, monkeypatch):
+    monkeypatch.setattr(settings, "question_import_chunk_size", 2)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    exam_id = client.post(
+        "/api/exams/",
+        json={"title": "Bank", "description": "Bulk", "duration_minutes": 30, "questions": []},
+        headers=headers,
+    ).json()["id"]
+
+    good = {"text": "Q", "options": {"A": "1", "B": "2"}, "correct_option": "A", "marks": 1}
+    lines = [json.dumps(good)] * 3 + ["not json", json.dumps({**good, "marks": "many"}), json.dumps({**good, "correct_option": "C"})]
+    response = client.post(
+        f"/api/exams/{exam_id}/questions/import",
+        files={"file": ("bank.jsonl", "\n".join(lines).encode(), "application/x-ndjson")},
+        headers=headers,
+    )
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (3, 3)
+    assert [error["line"] for error in report["errors"]] == [4, 5, 6]
+
+    csv_body = "text,option_A,option_B,correct_option,marks\nQ,1,2,B,2\nQ,1,2,B,\n"
+    response = client.post(
+        f"/api/exams/{exam_id}/questions/import",
+        files={"file": ("bank.csv", csv_body.encode(), "text/csv")},
+        headers=headers,
+    )
+    assert response.json()["imported"] == 1
+    assert response.json()["errors"][0]["line"] == 3
+
+    exam = client.get(f"/api/exams/{exam_id}", headers=headers).json()
+    assert len(exam["questions"]) == 4
+
+def test_bulk_assign_skips_existing_and_reports_unmatched(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    exam_id = client.post(
+        "/api/exams/",
+        json={"title": "Drive", "description": "Bulk", "duration_minutes": 30, "questions": []},
+        headers=headers,
+    ).json()["id"]
+    db = TestingSessionLocal()
+    candidates = [User(name=f"C{i}", email=f"c{i}@example.com", password_hash="x", role="user") for i in range(3)]
+    db.add_all(candidates)
+    db.commit()
+    ids = [candidate.id for candidate in candidates]
+    db.add(Submission(user_id=ids[0], exam_id=exam_id, answers={}, score=0))
+    db.commit()
+    db.close()
+
+    response = client.post(f"/api/exams/{exam_id}/assign/bulk", json={"user_ids": ids[:2] + [9999]}, headers=headers)
+    assert response.json() == {"inserted": 2, "skipped": 0, "unmatched_user_ids": [9999]}
+
+    # Every candidate without a submission: user@example.com and ids[2] are
+    # new, ids[1] is already assigned, ids[0] has submitted
+    response = client.post(f"/api/exams/{exam_id}/assign/bulk", json={"not_submitted": True}, headers=headers)
+    assert response.json() == {"inserted": 2, "skipped": 1}
+
+def test_exam_snapshot_etag_gzip_and_invalidation(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    exam_id = client.post(
+        "/api/exams/",
+        json={"title": "Snap", "description": "Cached", "duration_minutes": 30, "questions": [
+            {"text": "Q1", "options": {"A": "1", "B": "2"}, "correct_option": "A", "marks": 1}
+        ]},
+        headers=headers,
+    ).json()["id"]
+
+    response = client.get(f"/api/exams/{exam_id}", headers={**headers, "Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert [q["text"] for q in response.json()["questions"]] == ["Q1"]
+    etag = response.headers["etag"]
+
+    response = client.get(f"/api/exams/{exam_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    question_id = client.get(f"/api/exams/{exam_id}", headers=headers).json()["questions"][0]["id"]
+    client.put(
+        f"/api/questions/questions/{question_id}",
+        json={"text": "Q1 edited", "options": {"A": "1", "B": "2"}, "correct_option": "A", "marks": 1},
+        headers=headers,
+    )
+    response = client.get(f"/api/exams/{exam_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["questions"][0]["text"] == "Q1 edited"
+
+def test_my_submissions_is_not_shadowed_by_exam_route(client, user_token, admin_token):
+    exam_response = client.post(
+        "/api/exams",
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json={
+            "title": "My Submissions Exam",
+            "description": "Lists a candidate's own submissions.",
+            "duration_minutes": 10,
+            "questions": [{"text": "1 + 1?", "options": {"A": "2", "B": "3"}, "correct_option": "A", "marks": 1}]
+        }
+    )
+    exam_id = exam_response.json()["id"]
+    for _ in range(3):
+        client.post(
+            "/api/exams/submit",
+            headers={"Authorization": f"Bearer {user_token}"},
+            json={"exam_id": exam_id, "answers": {}, "duration_seconds": 30}
+        )
+
+    ids, cursor = [], None
+    while True:
+        params = {"exam_id": exam_id, "limit": 2, "fields": "id,score"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/exams/my-submissions", params=params, headers={"Authorization": f"Bearer {user_token}"})
+        assert response.status_code == 200
+        ids.extend(row["id"] for row in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(ids) == len(set(ids)) == 3
@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.inference import inference_executor
+
+client = TestClient(app)
+
+def test_health_reports_model_readiness():
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "models_ready": inference_executor.is_ready()}
+
+def test_readiness_is_503_until_models_are_warm(monkeypatch):
+    monkeypatch.setattr(inference_executor, "is_ready", lambda: False)
+    response = client.get("/api/health/ready")
+    assert response.status_code == 503
+    assert response.json()["models_ready"] is False
+
+    monkeypatch.setattr(inference_executor, "is_ready", lambda: True)
+    response = client.get("/api/health/ready")
+    assert response.status_code == 200
+    assert response.json()["models_ready"] is True
@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine, inspect, text
+from app.migrations import LATEST_VERSION, migrate, schema_version
+from app.models.proctor import decode_embedding
+
+def test_migrate_upgrades_legacy_schema_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    # Tables as the first releases created them, before any column checks ran
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, email VARCHAR NOT NULL, password_hash VARCHAR NOT NULL)"))
+        connection.execute(text("CREATE TABLE user_faces (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, embedding_vector JSON NOT NULL, image_path VARCHAR NOT NULL, created_at DATETIME)"))
+        connection.execute(text("CREATE TABLE proctor_logs (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, exam_id INTEGER NOT NULL, session_id VARCHAR NOT NULL, event_type VARCHAR NOT NULL, image_path VARCHAR, audio_path VARCHAR, timestamp DATETIME)"))
+        connection.execute(text("INSERT INTO users (id, name, email, password_hash) VALUES (1, 'a', 'a@example.com', 'x')"))
+        connection.execute(text("INSERT INTO user_faces (user_id, embedding_vector, image_path) VALUES (1, '[0.5, 0.25]', 'a.jpg')"))
+        connection.execute(text("INSERT INTO proctor_logs (user_id, exam_id, session_id, event_type) VALUES (1, 7, 's1', 'no_face'), (1, 7, 's2', 'no_face')"))
+
+    assert schema_version(engine) == 0
+    assert migrate(engine) == list(range(1, LATEST_VERSION + 1))
+    assert schema_version(engine) == LATEST_VERSION
+    assert migrate(engine) == []
+
+    inspector = inspect(engine)
+    assert {"role", "token_version"} <= {col["name"] for col in inspector.get_columns("users")}
+    assert "frame_id" in [col["name"] for col in inspector.get_columns("proctor_logs")]
+    assert "duplicate_of_user_id" in [col["name"] for col in inspector.get_columns("user_faces")]
+    assert "ix_proctor_logs_exam_id_timestamp" in [ix["name"] for ix in inspector.get_indexes("proctor_logs")]
+    assert "ix_submissions_user_id_exam_id" in [ix["name"] for ix in inspector.get_indexes("submissions")]
+    with engine.connect() as connection:
+        blob = connection.execute(text("SELECT embedding FROM user_faces")).scalar()
+        # Logs written before the rollup tables existed are counted
+        assert connection.execute(text("SELECT COUNT(*), SUM(count) FROM session_event_counts WHERE exam_id = 7")).one() == (2, 2)
+    assert decode_embedding(blob).tolist() == [0.5, 0.25]
+
+def test_migrate_builds_a_fresh_database_matching_the_models(tmp_path):
+    from app.core.database import Base
+    from app.models import assignment, exam, proctor, user
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrate(engine)
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {col["name"] for col in inspector.get_columns(table.name)} == set(table.columns.keys()), table.name
+        indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        assert {ix.name for ix in table.indexes} <= indexes, table.name
@@ -7,6 +7,30 @@ from sqlalchemy.orm import sessionmaker
 from app.models.user import User
 from app.models.exam import Exam
 from app.core.security import create_access_token
+from app.core.config import settings
+from app.models.proctor import ProctorLog, UserFace, encode_embedding, decode_embedding
+from starlette.websockets import WebSocketDisconnect
+from app.routers import proctor
+from app.core import database, export
+from app.services.proctoring import _align_face, decode_image, detect_faces, jpeg_size, EmbeddingBatcher, FrameGate, frame_signature
+from app.services import model_registry
+from deepface.models.Detector import FacialAreaRegion
+from app.services.inference import InferenceExecutor, InferenceQueueFull
+from app.services.frame_ingest import FrameIngestQueue
+from app.services.baseline_cache import BaselineCache, baseline_cache
+from app.services.face_index import FaceIndex, face_index, find_duplicate_identity
+from app.services.frame_store import SWEEP_GRACE_SECONDS, FrameStore, sweep_expired_frames
+from app.services.rollups import active_exam_ids, exam_event_counts, reconcile_recent
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import datetime
+import gzip
+import json
+import threading
+import time
+import cv2
+import numpy as np
 import os
 
 # Create a test database
@@ -31,6 +55,8 @@ def setup_database():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    baseline_cache.clear()
+    face_index.clear()
 
 
 @pytest.fixture
@@ -98,8 +124,542 @@ def test_get_proctor_logs_as_admin(create_test_admin):
     assert response.status_code == 200
     assert response.json() == []
 
+def test_proctor_logs_keyset_pages_and_filters(create_test_admin):
+    admin = create_test_admin
+    db = next(override_get_db())
+    base = datetime.datetime(2024, 1, 1)
+    for i in range(5):
+        db.add(ProctorLog(
+            user_id=admin.id, exam_id=1, session_id="s1",
+            event_type="no_face" if i % 2 else "normal",
+            timestamp=base + datetime.timedelta(seconds=i // 2),
+        ))
+    db.commit()
+
+    ids, cursor = [], None
+    while True:
+        params = {"exam_id": 1, "limit": 2, "fields": "id,event_type"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/proctor/logs", params=params, headers=get_auth_header(admin))
+        assert response.status_code == 200
+        page = response.json()
+        assert all(set(row) == {"id", "event_type"} for row in page)
+        ids += [row["id"] for row in page]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    # Newest first, with ties on timestamp broken by id and nothing repeated
+    assert ids == [5, 4, 3, 2, 1]
+
+    response = client.get("/api/proctor/logs", params={"exam_id": 1, "event_type": "no_face"}, headers=get_auth_header(admin))
+    assert [row["id"] for row in response.json()] == [4, 2]
+
+    response = client.get("/api/proctor/logs", params={"exam_id": 1, "fields": "password"}, headers=get_auth_header(admin))
+    assert response.status_code == 400
+
+def test_proctor_logs_export_streams_ndjson_and_gzipped_csv(create_test_admin, monkeypatch):
+    admin = create_test_admin
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 2)
+    db = next(override_get_db())
+    for i in range(5):
+        db.add(ProctorLog(user_id=admin.id, exam_id=1, session_id="s1", event_type="normal"))
+    db.commit()
+
+    response = client.get("/api/proctor/logs/export", params={"exam_id": 1, "fields": "id,session_id"}, headers=get_auth_header(admin))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [{"id": i, "session_id": "s1"} for i in range(1, 6)]
+
+    response = client.get(
+        "/api/proctor/logs/export",
+        params={"exam_id": 1, "fields": "id,event_type", "format": "csv", "gzip": True},
+        headers=get_auth_header(admin),
+    )
+    assert response.headers["content-type"] == "application/gzip"
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert lines[0] == "id,event_type"
+    assert len(lines) == 6
+
+def test_summary_reads_rollups_and_rebuild_reconciles_them(create_test_admin):
+    admin = create_test_admin
+    db = next(override_get_db())
+    for session_id, event in [("s1", "face_match"), ("s1", "no_face"), ("s2", "no_face")]:
+        proctor.log_event(db, admin.id, 1, session_id, event)
+
+    response = client.get("/api/proctor/summary?exam_id=1", headers=get_auth_header(admin))
+    assert response.json() == {"face_match": 1, "no_face": 2}
+    response = client.get("/api/proctor/summary?exam_id=1&session_id=s2", headers=get_auth_header(admin))
+    assert response.json() == {"no_face": 1}
+
+    # Rows written behind the rollups' back only show up after a rebuild
+    db.add(ProctorLog(user_id=admin.id, exam_id=1, session_id="s2", event_type="multi_face"))
+    db.commit()
+    response = client.post("/api/proctor/summary/rebuild?exam_id=1", headers=get_auth_header(admin))
+    assert response.json() == {"face_match": 1, "no_face": 2, "multi_face": 1}
+
+def test_reconciler_rebuilds_only_recently_active_exams(create_test_admin):
+    admin = create_test_admin
+    db = TestingSessionLocal()
+    active = Exam(title="Active", owner_id=admin.id, duration_minutes=5)
+    idle = Exam(title="Idle", owner_id=admin.id, duration_minutes=5)
+    db.add_all([active, idle])
+    db.commit()
+    now = datetime.datetime.utcnow()
+    db.add(ProctorLog(user_id=admin.id, exam_id=active.id, session_id="s1", event_type="no_face", timestamp=now))
+    db.add(ProctorLog(user_id=admin.id, exam_id=idle.id, session_id="s1", event_type="no_face", timestamp=now - datetime.timedelta(days=1)))
+    # A stale counter for an event the active exam's logs no longer contain
+    proctor.record_event(db, active.id, "s1", "multi_face")
+    db.commit()
+
+    assert active_exam_ids(db, now - datetime.timedelta(hours=1)) == [active.id]
+    reconcile_recent(TestingSessionLocal, now - datetime.timedelta(hours=1))
+    assert exam_event_counts(db, active.id) == {"no_face": 1}
+    assert exam_event_counts(db, idle.id) == {}
+    db.close()
+
 def test_get_proctor_logs_as_user(create_test_user):
     user = create_test_user
     response = client.get("/api/proctor/logs?exam_id=1", headers=get_auth_header(user))
     assert response.status_code == 403
     assert response.json() == {"detail": "Not authorized"}
+
+def test_decode_image_in_memory():
+    img = np.zeros((48, 64, 3), dtype=np.uint8)
+    ok, encoded = cv2.imencode(".jpg", img)
+    assert ok
+
+    decoded = decode_image(encoded.tobytes())
+    assert decoded.shape == (48, 64, 3)
+    assert decode_image(os.urandom(1024)) is None
+    assert decode_image(b"") is None
+
+def test_decode_image_reduces_large_jpegs():
+    ok, encoded = cv2.imencode(".jpg", np.zeros((1080, 1920, 3), dtype=np.uint8))
+    data = encoded.tobytes()
+    assert jpeg_size(data) == (1920, 1080)
+    assert decode_image(data, min_side=960).shape == (540, 960, 3)
+    assert decode_image(data, min_side=1000).shape == (1080, 1920, 3)
+
+def test_detect_faces_maps_boxes_back_to_full_resolution(monkeypatch):
+    seen = {}
+
+    class FakeDetector:
+        def detect_faces(self, img):
+            seen["shape"] = img.shape
+            return [FacialAreaRegion(x=100, y=100, w=60, h=60, left_eye=(145, 120), right_eye=(115, 120), confidence=0.9)]
+
+    monkeypatch.setattr(model_registry, "get_detector", lambda: FakeDetector())
+    monkeypatch.setattr(settings, "face_detector_input_size", 640)
+    img = np.full((1080, 1920, 3), 200, dtype=np.uint8)
+
+    faces = detect_faces(img)
+    assert seen["shape"] == (360, 640, 3)
+    # A 60px box on the 1/3-scale copy is cropped as 180px from the original
+    assert faces[0].shape == (180, 180, 3)
+    assert faces[0].max() <= 1.0
+
+def test_align_face_matches_full_frame_alignment():
+    from deepface.modules import detection
+
+    rng = np.random.default_rng(0)
+    img = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (9, 9), 0)
+    # A tilted face near the corner, so the window runs past the frame
+    region = FacialAreaRegion(x=10, y=20, w=80, h=90, left_eye=(70, 60), right_eye=(30, 45), confidence=0.9)
+
+    # What DeepFace does: pad the whole frame, rotate it, project the box
+    hb, wb = img.shape[0] // 2, img.shape[1] // 2
+    padded = cv2.copyMakeBorder(img, hb, hb, wb, wb, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+    aligned, angle = detection.align_img_wrt_eyes(img=padded, left_eye=(70 + wb, 60 + hb), right_eye=(30 + wb, 45 + hb))
+    x1, y1, x2, y2 = detection.project_facial_area(
+        facial_area=(10 + wb, 20 + hb, 90 + wb, 110 + hb), angle=angle, size=(padded.shape[0], padded.shape[1])
+    )
+    expected = aligned[y1:y2, x1:x2].astype(np.float32)
+
+    face = _align_face(img, region).astype(np.float32)
+    assert face.shape == expected.shape == (90, 80, 3)
+    assert np.abs(face - expected).mean() < 8
+
+def test_embedding_batcher_groups_concurrent_requests():
+    batch_sizes = []
+    release = threading.Event()
+
+    def embed_fn(faces):
+        batch_sizes.append(len(faces))
+        release.wait(5)
+        return np.stack([face.reshape(-1)[:2] for face in faces])
+
+    batcher = EmbeddingBatcher(max_batch_size=4, max_wait_ms=200, embed_fn=embed_fn)
+    faces = [np.full((2, 2, 3), i, dtype=np.float32) for i in range(5)]
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        first = pool.submit(batcher.embed, faces[0])
+        # Crops that arrive while a batch runs are embedded together next
+        while not batch_sizes:
+            time.sleep(0.001)
+        rest = [pool.submit(batcher.embed, face) for face in faces[1:]]
+        while batcher._queue.qsize() < 4:
+            time.sleep(0.001)
+        release.set()
+        results = [first.result(timeout=5)] + [future.result(timeout=5) for future in rest]
+
+    assert batch_sizes == [1, 4]
+    for i, embedding in enumerate(results):
+        assert embedding.tolist() == [i, i]
+
+def test_embedding_batcher_does_not_wait_for_a_lone_frame():
+    batcher = EmbeddingBatcher(max_batch_size=8, max_wait_ms=2000, embed_fn=lambda faces: [face.sum() for face in faces])
+    started = time.monotonic()
+    assert batcher.embed(np.ones(3)) == 3
+    assert time.monotonic() - started < 1
+
+def test_inference_executor_sheds_load_when_full():
+    executor = InferenceExecutor("thread", max_workers=1, max_pending=1)
+    release = threading.Event()
+    try:
+        running = executor.submit(release.wait, 5)
+        with pytest.raises(InferenceQueueFull):
+            executor.submit(release.wait, 5)
+
+        release.set()
+        assert running.result(timeout=5) is True
+        assert executor.submit(sum, [1, 2]).result(timeout=5) == 3
+        assert executor.pending() == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+def test_process_executor_spawns_workers_and_replaces_a_broken_pool():
+    executor = InferenceExecutor("process", max_workers=1, max_pending=4)
+    executor.start(preload=False)
+    try:
+        assert executor._pool._mp_context.get_start_method() == "spawn"
+        # A worker killed mid-task, as by the OOM killer, breaks the pool
+        with pytest.raises(BrokenProcessPool):
+            executor.submit(os._exit, 1).result(timeout=60)
+        assert executor.submit(sum, [1, 2]).result(timeout=60) == 3
+        assert executor.pending() == 0
+    finally:
+        executor.shutdown()
+
+def test_broken_inference_pool_defers_frames_instead_of_failing(monkeypatch):
+    calls = []
+
+    async def broken(fn, *args):
+        calls.append(fn)
+        raise BrokenProcessPool()
+
+    monkeypatch.setattr(proctor, "run_inference", broken)
+    assert asyncio.run(proctor.analyze_or_defer(b"frame", [0.0])) == ("deferred", {}, False)
+    # An accepted /frames frame is retried once, then gets a verdict
+    assert asyncio.run(proctor.analyze_or_defer(b"frame", [0.0], wait=True)) == ("error", {}, False)
+    assert len(calls) == 3
+
+def test_async_frame_result_is_logged_and_retrievable(create_test_user, monkeypatch):
+    user = create_test_user
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(settings, "persist_frame_images", False)
+
+    proctor.pending_frames[(user.id, "async_session")].add("frame-1")
+    asyncio.run(proctor.complete_frame(user.id, 1, "async_session", "frame-1", b"not an image", "frame.jpg", [0.0]))
+    assert (user.id, "async_session") not in proctor.pending_frames
+
+    response = client.get("/api/proctor/sessions/async_session/events", headers=get_auth_header(user))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pending"] == []
+    assert [(e["frame_id"], e["event"]) for e in data["events"]] == [("frame-1", "error")]
+
+    response = client.get(
+        f"/api/proctor/sessions/async_session/events?after_id={data['events'][0]['id']}",
+        headers=get_auth_header(user)
+    )
+    assert response.json()["events"] == []
+
+def test_queued_frame_waits_for_executor_capacity(create_test_user, monkeypatch):
+    user = create_test_user
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(settings, "persist_frame_images", False)
+    executor = InferenceExecutor("thread", max_workers=1, max_pending=1)
+    monkeypatch.setattr(proctor, "inference_executor", executor)
+    monkeypatch.setattr(proctor, "analyze_frame", lambda data, baseline: ("face_match", {}))
+    ingest = FrameIngestQueue(max_queued=1, workers=1)
+
+    async def run():
+        release = threading.Event()
+        blocker = executor.submit(release.wait)
+        assert ingest.offer(proctor.complete_frame, user.id, 1, "busy", "f1", b"frame", "f.jpg", [0.0])
+        # The queue holds one frame; the next is refused rather than buffered
+        assert not ingest.offer(proctor.complete_frame, user.id, 1, "busy", "f2", b"frame", "f.jpg", [0.0])
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.wrap_future(blocker)
+        await ingest.join()
+
+    asyncio.run(run())
+    db = next(override_get_db())
+    assert [(log.frame_id, log.event_type) for log in db.query(ProctorLog)] == [("f1", "face_match")]
+
+def test_ingest_rejects_when_queue_is_full(create_test_user, monkeypatch):
+    user = create_test_user
+
+    async def baseline(db, async_db, user_id):
+        return np.zeros(4, dtype=np.float32)
+
+    monkeypatch.setattr(proctor, "load_baseline_embedding", baseline)
+    monkeypatch.setattr(proctor.frame_ingest, "offer", lambda *args: False)
+    response = client.post(
+        "/api/proctor/frames",
+        headers=get_auth_header(user),
+        data={"exam_id": 1, "session_id": "full"},
+        files={"file": ("f.jpg", b"frame", "image/jpeg")},
+    )
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+def test_frame_stream_requires_baseline(create_test_user):
+    user = create_test_user
+    token = create_access_token(data={"sub": user.email})
+    with client.websocket_connect(f"/api/proctor/ws?token={token}&exam_id=1&session_id=ws_session") as websocket:
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            websocket.receive_json()
+    assert exc_info.value.code == 1008
+
+def test_frame_stream_returns_verdict_per_frame(create_test_user, monkeypatch):
+    user = create_test_user
+    monkeypatch.setattr(settings, "persist_frame_images", False)
+    db = next(override_get_db())
+    db.add(UserFace(user_id=user.id, embedding_vector=[0.0], image_path="baseline.jpg"))
+    db.commit()
+
+    token = create_access_token(data={"sub": user.email})
+    with client.websocket_connect(f"/api/proctor/ws?token={token}&exam_id=1&session_id=ws_session") as websocket:
+        for _ in range(2):
+            websocket.send_bytes(b"not an image")
+            assert websocket.receive_json()["event"] == "error"
+
+    assert db.query(ProctorLog).filter(ProctorLog.session_id == "ws_session").count() == 2
+
+def test_reused_verdicts_are_marked_in_the_log(create_test_user, monkeypatch):
+    user = create_test_user
+    monkeypatch.setattr(settings, "persist_frame_images", False)
+    monkeypatch.setattr(proctor, "analyze_frame", lambda data, baseline: ("face_match", {}))
+    on_event_loop = []
+
+    def signature_off_loop(data):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        return frame_signature(data)
+
+    monkeypatch.setattr(proctor, "frame_signature", signature_off_loop)
+    db = next(override_get_db())
+    db.add(UserFace(user_id=user.id, embedding_vector=[0.0], image_path="baseline.jpg"))
+    db.commit()
+    frame = cv2.imencode(".jpg", np.full((240, 320, 3), 120, dtype=np.uint8))[1].tobytes()
+
+    token = create_access_token(data={"sub": user.email})
+    with client.websocket_connect(f"/api/proctor/ws?token={token}&exam_id=1&session_id=reuse_session") as websocket:
+        verdicts = []
+        for _ in range(2):
+            websocket.send_bytes(frame)
+            verdicts.append(websocket.receive_json()["reused"])
+    assert verdicts == [False, True]
+    # The gate's JPEG decode never runs on the event loop
+    assert on_event_loop == [False, False]
+
+    logs = db.query(ProctorLog.event_type, ProctorLog.reused).filter(ProctorLog.session_id == "reuse_session").order_by(ProctorLog.id)
+    assert [tuple(log) for log in logs] == [("face_match", False), ("face_match", True)]
+
+def test_frame_gate_reuses_verdict_for_unchanged_frames():
+    still = np.full((240, 320, 3), 120, dtype=np.uint8)
+    moved = still.copy()
+    moved[:, :160] = 20
+    still_sig = frame_signature(cv2.imencode(".jpg", still)[1].tobytes())
+    moved_sig = frame_signature(cv2.imencode(".jpg", moved)[1].tobytes())
+
+    gate = FrameGate(threshold=3.0, max_skips=2)
+    assert gate.check("session", still_sig) is None
+    gate.update("session", still_sig, "face_match")
+
+    assert gate.check("session", still_sig) == "face_match"
+    assert gate.check("session", moved_sig) is None
+    assert gate.check("session", still_sig) == "face_match"
+    # The skip budget is spent; the next frame must be analyzed again
+    assert gate.check("session", still_sig) is None
+
+    gate.update("session", still_sig, "error")
+    assert gate.check("session", still_sig) is None
+
+def test_baseline_cache_normalizes_and_counts():
+    cache = BaselineCache(max_size=2, ttl_seconds=60)
+    assert cache.get(1) is None
+
+    vector = cache.put(1, [3.0, 4.0])
+    assert vector.dtype == np.float32
+    assert vector.flags.c_contiguous
+    assert np.allclose(vector, [0.6, 0.8])
+    assert cache.get(1) is vector
+
+    cache.put(2, [1.0, 0.0])
+    cache.put(3, [0.0, 1.0])
+    assert cache.get(1) is None  # evicted as least recently used
+
+    cache.invalidate(3)
+    assert cache.get(3) is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 3}
+
+def test_proctor_stats_exposes_cache_counters(create_test_admin):
+    admin = create_test_admin
+    response = client.get("/api/proctor/stats", headers=get_auth_header(admin))
+    assert response.status_code == 200
+    assert set(response.json()["baseline_cache"]) == {"size", "hits", "misses"}
+
+def test_embedding_is_stored_as_float32_blob(create_test_user):
+    user = create_test_user
+    vector = np.linspace(-1, 1, 4096, dtype=np.float32)
+    assert len(encode_embedding(vector)) == 4096 * 4
+    assert np.array_equal(decode_embedding(encode_embedding(vector.tolist())), vector)
+
+    db = next(override_get_db())
+    db.add(UserFace(user_id=user.id, embedding=vector, image_path="baseline.jpg"))
+    db.commit()
+    db.expire_all()
+
+    stored = db.query(UserFace).filter(UserFace.user_id == user.id).one()
+    assert stored.embedding.dtype == np.float32
+    assert np.array_equal(stored.embedding, vector)
+    assert stored.embedding_vector is None
+
+def test_face_index_nearest_neighbour_add_remove_and_snapshot(tmp_path):
+    rng = np.random.default_rng(0)
+    faces = rng.normal(size=(1500, 64)).astype(np.float32)
+    index = FaceIndex(initial_capacity=16)
+    for user_id, face in enumerate(faces, start=1):
+        index.add(user_id, face)
+    assert len(index) == 1500
+
+    probe = faces[41] + rng.normal(scale=0.01, size=64)
+    (user_id, distance), = index.query(probe)
+    assert user_id == 42 and distance < 0.1
+    assert index.query(probe, exclude_user_id=42)[0][0] != 42
+
+    index.remove(42)
+    assert index.query(probe)[0][0] != 42
+    assert index.query(faces[-1])[0] == (1500, pytest.approx(0.0, abs=1e-3))
+
+    snapshot = str(tmp_path / "faces.npz")
+    index.save(snapshot)
+    restored = FaceIndex()
+    assert restored.load(snapshot)
+    assert len(restored) == 1499
+    assert restored.query(faces[9])[0][0] == 10
+
+def test_find_duplicate_identity_across_accounts(create_test_user, create_test_admin):
+    user, other = create_test_user, create_test_admin
+    face = np.linspace(-1, 1, 128, dtype=np.float32)
+    db = next(override_get_db())
+    db.add(UserFace(user_id=other.id, embedding=face, image_path="other.jpg"))
+    db.commit()
+
+    assert find_duplicate_identity(db, user.id, face + 0.001) == other.id
+    assert find_duplicate_identity(db, other.id, face) is None
+    assert find_duplicate_identity(db, user.id, -face) is None
+
+def test_face_index_sync_picks_up_faces_committed_out_of_id_order(create_test_user, create_test_admin, tmp_path):
+    user, admin = create_test_user, create_test_admin
+    rng = np.random.default_rng(1)
+    first, second = rng.normal(size=(2, 64)).astype(np.float32)
+    db = next(override_get_db())
+    index = FaceIndex()
+
+    # Face 2 commits first, as when id 1's registration is still running
+    db.add(UserFace(id=2, user_id=admin.id, embedding=second, image_path="b.jpg"))
+    db.commit()
+    index.sync(db)
+    assert index.last_face_id == 2 and len(index) == 1
+
+    db.add(UserFace(id=1, user_id=user.id, embedding=first, image_path="a.jpg"))
+    db.commit()
+    snapshot = str(tmp_path / "faces.npz")
+    index.save(snapshot)
+    restored = FaceIndex()
+    restored.load(snapshot)
+    for synced in (index, restored):
+        synced.sync(db)
+        assert len(synced) == 2
+        assert synced.query(first)[0][0] == user.id
+
+def test_duplicate_registrations_are_flagged_for_admins_only(create_test_user, create_test_admin, monkeypatch, tmp_path):
+    user, admin = create_test_user, create_test_admin
+    monkeypatch.setattr(proctor, "frame_store", FrameStore(str(tmp_path)))
+    face = np.linspace(-1, 1, 128, dtype=np.float32)
+    db = next(override_get_db())
+    db.add(UserFace(user_id=admin.id, embedding=face, image_path="admin.jpg"))
+    db.commit()
+
+    # Before the index is built the check waits for the build
+    proctor.save_registration(db, user.id, (face + 0.001).tolist(), b"first", "a.jpg")
+    assert db.query(UserFace).filter(UserFace.user_id == user.id).one().duplicate_of_user_id is None
+    face_index.build(TestingSessionLocal)
+    db.expire_all()
+    assert db.query(UserFace).filter(UserFace.user_id == user.id).one().duplicate_of_user_id == admin.id
+
+    # Once it is ready the check runs during registration
+    proctor.save_registration(db, user.id, (face + 0.002).tolist(), b"second", "b.jpg")
+    response = client.get("/api/proctor/duplicates", headers=get_auth_header(admin))
+    assert [(row["user_id"], row["duplicate_of_user_id"]) for row in response.json()] == [(user.id, admin.id)] * 2
+    assert client.get("/api/proctor/duplicates", headers=get_auth_header(user)).status_code == 403
+
+def test_frame_store_dedups_and_sweeper_enforces_retention(create_test_user, tmp_path):
+    user = create_test_user
+    store = FrameStore(str(tmp_path))
+    match_path = store.put(b"same frame", "a.JPG")
+    assert store.put(b"same frame", "b.jpg") == match_path
+    assert os.path.relpath(match_path, tmp_path).count(os.sep) == 2
+    evidence_path = store.put(b"no face here", "c.jpg")
+
+    db = next(override_get_db())
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=10)
+    for event, path, timestamp in [
+        ("face_match", match_path, old),
+        ("no_face", evidence_path, old),
+        ("face_match", evidence_path, datetime.datetime.utcnow()),
+    ]:
+        db.add(ProctorLog(user_id=user.id, exam_id=1, session_id="s1", event_type=event, image_path=path, timestamp=timestamp))
+    db.commit()
+    stale = time.time() - SWEEP_GRACE_SECONDS - 60
+    for path in (match_path, evidence_path):
+        os.utime(path, (stale, stale))
+
+    assert sweep_expired_frames(db, store, {"face_match": 7}) == 1
+    assert not os.path.exists(match_path)
+    assert os.path.exists(evidence_path)
+    assert db.query(ProctorLog).filter(ProctorLog.image_path.is_(None)).count() == 1
+
+def test_sweeper_keeps_frames_reused_by_uncommitted_rows(create_test_user, tmp_path):
+    user = create_test_user
+    store = FrameStore(str(tmp_path))
+    path = store.put(b"repeated frame", "a.jpg")
+    stale = time.time() - SWEEP_GRACE_SECONDS - 60
+    os.utime(path, (stale, stale))
+
+    db = next(override_get_db())
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=10)
+    db.add(ProctorLog(user_id=user.id, exam_id=1, session_id="s1", event_type="face_match", image_path=path, timestamp=old))
+    db.commit()
+
+    # A new frame with the same bytes dedups onto the file before its row
+    # is committed; reusing it marks it fresh so the sweeper leaves it
+    assert store.put(b"repeated frame", "b.jpg") == path
+    assert os.path.getmtime(path) > stale
+    assert sweep_expired_frames(db, store, {"face_match": 7}) == 0
+    assert os.path.exists(path)
+
+    # A file swept before the dedup is written again
+    os.remove(path)
+    assert store.put(b"repeated frame", "b.jpg") == path
+    with open(path, "rb") as f:
+        assert f.read() == b"repeated frame"
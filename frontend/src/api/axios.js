@@ -69,7 +69,7 @@ export const examAPI = {
   updateExam: (id, examData) => api.put(`/exams/${id}`, examData),
   deleteExam: (id) => api.delete(`/exams/${id}`),
   getDashboardStats: () => api.get('/exams/admin/stats'),
-  getAllSubmissions: () => api.get('/submissions/admin/all'),
+  getAllSubmissions: (cursor) => api.get('/submissions/admin/all', { params: { cursor } }),
   getQuestions: () => api.get('/questions'),
   createQuestion: (questionData) => api.post('/questions', questionData),
   updateQuestion: (id, questionData) => api.put(`/questions/${id}`, questionData),
@@ -93,6 +93,6 @@ export const proctorAPI = {
     formData.append('file', file);
     return api.post('/proctor/frame', formData);
   },
-  getLogs: (examId) => api.get('/proctor/logs', { params: { exam_id: examId } }),
+  getLogs: (examId, cursor) => api.get('/proctor/logs', { params: { exam_id: examId, cursor } }),
   getSummary: (examId) => api.get('/proctor/summary', { params: { exam_id: examId } }),
 };
\ No newline at end of file
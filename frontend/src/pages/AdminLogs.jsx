@@ -19,6 +19,8 @@ const AdminLogs = () => {
   const [summary, setSummary] = useState({});
   const [loading, setLoading] = useState(false);
   const [exams, setExams] = useState([]);
+  // Logs are paginated; the next page's cursor comes back in X-Next-Cursor
+  const [nextCursor, setNextCursor] = useState(null);
 
   // Dummy data for demo
   const dummyExams = [
@@ -85,15 +87,17 @@ const AdminLogs = () => {
     }
   };
 
-  const fetchLogs = async () => {
+  const fetchLogs = async (cursor) => {
     if (!selectedExam) return;
     
-    setLoading(true);
+    if (!cursor) setLoading(true);
     try {
-      const response = await proctorAPI.getLogs(selectedExam);
-      setLogs(response.data);
+      const response = await proctorAPI.getLogs(selectedExam, cursor);
+      setLogs((prev) => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
-      setLogs(dummyLogs);
+      if (!cursor) setLogs(dummyLogs);
+      setNextCursor(null);
     } finally {
       setLoading(false);
     }
@@ -283,6 +287,17 @@ const AdminLogs = () => {
                         </tbody>
                       </table>
 
+                      {nextCursor && (
+                        <div className="flex justify-center py-4">
+                          <button
+                            onClick={() => fetchLogs(nextCursor)}
+                            className="px-4 py-2 bg-gray-200 rounded-lg"
+                          >
+                            Load more
+                          </button>
+                        </div>
+                      )}
+
                       {logs.length === 0 && (
                         <div className="text-center py-12">
                           <EyeIcon className="w-16 h-16 text-gray-300 mx-auto mb-4" />
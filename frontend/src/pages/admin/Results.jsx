@@ -6,18 +6,22 @@ const AdminResults = () => {
   const [submissions, setSubmissions] = useState([]);
   const [loading, setLoading] = useState(true);
   const [selectedSubmission, setSelectedSubmission] = useState(null);
+  // The list is paginated; the next page's cursor comes back in X-Next-Cursor
+  const [nextCursor, setNextCursor] = useState(null);
+
+  const fetchSubmissions = async (cursor) => {
+    try {
+      const response = await examAPI.getAllSubmissions(cursor);
+      setSubmissions((prev) => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Failed to fetch submissions:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
 
   useEffect(() => {
-    const fetchSubmissions = async () => {
-      try {
-        const response = await examAPI.getAllSubmissions();
-        setSubmissions(response.data);
-      } catch (error) {
-        console.error('Failed to fetch submissions:', error);
-      } finally {
-        setLoading(false);
-      }
-    };
     fetchSubmissions();
   }, []);
 
@@ -54,6 +58,13 @@ const AdminResults = () => {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <div className="flex justify-center py-4">
+              <button onClick={() => fetchSubmissions(nextCursor)} className="px-4 py-2 bg-gray-200 rounded-lg">
+                Load more
+              </button>
+            </div>
+          )}
         </div>
       )}
       {selectedSubmission && (